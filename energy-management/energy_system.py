@@ -5,10 +5,12 @@ Author: Deepak
 Version: 2.0
 """
 
+import os
 import time
 import json
 import sqlite3
 import threading
+import queue
 import schedule
 import numpy as np
 import pandas as pd
@@ -16,22 +18,234 @@ from datetime import datetime, timedelta
 import paho.mqtt.client as mqtt
 import requests
 import logging
+import signal
+import importlib.util
 from collections import defaultdict, deque
-import matplotlib.pyplot as plt
-import seaborn as sns
+from itertools import groupby
 
 # Machine Learning imports
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
+from sklearn.utils.validation import check_is_fitted
 import joblib
 
-# Time series analysis
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
+# Optional LZ4 compression for persisted models; joblib imports lz4 itself
+LZ4_AVAILABLE = importlib.util.find_spec('lz4') is not None
+
+# Time series forecasting (statsmodels is imported lazily as a fallback)
+from scipy.optimize import minimize
+
+# Optional fast JSON codec
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("orjson not available, using json module")
+
+# Both accept raw bytes payloads; paho-mqtt publishes either str or bytes
+json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+json_dumps = orjson.dumps if ORJSON_AVAILABLE else json.dumps
+
+# Optional JIT compilation for numeric kernels
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    print("Numba not available, using statsmodels for forecasting")
+    
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+@njit(cache=True)
+def _arma_residuals(y, phi, theta):
+    """Conditional residuals of an ARMA(p, q) model over a centered series"""
+    n = y.shape[0]
+    p = phi.shape[0]
+    q = theta.shape[0]
+    residuals = np.zeros(n)
+    for t in range(n):
+        prediction = 0.0
+        for i in range(min(p, t)):
+            prediction += phi[i] * y[t - i - 1]
+        for j in range(min(q, t)):
+            prediction += theta[j] * residuals[t - j - 1]
+        residuals[t] = y[t] - prediction
+    return residuals
+
+@njit(cache=True)
+def _arma_loss(params, y, p, q):
+    """Mean squared conditional residual, minimized when fitting ARMA(p, q)"""
+    residuals = _arma_residuals(y, params[:p], params[p:p + q])
+    return np.sum(residuals * residuals) / y.shape[0]
+
+@njit(cache=True)
+def _arma_forecast(y, residuals, phi, theta, steps):
+    """Recursive multi-step ARMA forecast with future shocks set to zero"""
+    n = y.shape[0]
+    p = phi.shape[0]
+    q = theta.shape[0]
+    history = np.concatenate((y, np.zeros(steps)))
+    errors = np.concatenate((residuals, np.zeros(steps)))
+    for t in range(n, n + steps):
+        value = 0.0
+        for i in range(min(p, t)):
+            value += phi[i] * history[t - i - 1]
+        for j in range(min(q, t)):
+            value += theta[j] * errors[t - j - 1]
+        history[t] = value
+    return history[n:]
+
+@njit(cache=True, fastmath=True)
+def _build_features(power, hour, day, month, weekday, temperature, humidity, cloud_cover):
+    """Single-pass feature matrix matching create_prediction_features (NaN-free power)"""
+    n = power.shape[0]
+    features = np.empty((n, 11))
+    window_total = 0.0
+    for i in range(n):
+        features[i, 0] = hour[i]
+        features[i, 1] = day[i]
+        features[i, 2] = month[i]
+        features[i, 3] = weekday[i]
+        features[i, 4] = 1.0 if weekday[i] >= 5 else 0.0
+        
+        # Previous day / previous week same hour
+        features[i, 5] = power[i - 24] if i >= 24 else 0.0
+        features[i, 6] = power[i - 168] if i >= 168 else 0.0
+        
+        # Running-sum moving average: expanding for the first rows, then previous 6 hours
+        if i < 6:
+            window_total += power[i]
+            features[i, 7] = window_total / (i + 1)
+        else:
+            if i > 6:
+                window_total += power[i - 1] - power[i - 7]
+            features[i, 7] = window_total / 6.0
+            
+        features[i, 8] = temperature
+        features[i, 9] = humidity
+        features[i, 10] = cloud_cover
+    return features
+
+@njit(cache=True)
+def _min_window_cost(loads, rates, device_power, duration):
+    """Start index of the cheapest duration-long window to run an extra load"""
+    slot_count = loads.shape[0] - duration
+    window_cost = 0.0
+    for i in range(duration):
+        window_cost += (loads[i] + device_power) * rates[i]
+    min_cost = window_cost
+    best_idx = 0
+    for start in range(1, slot_count):
+        end = start + duration - 1
+        window_cost += (loads[end] + device_power) * rates[end]
+        window_cost -= (loads[start - 1] + device_power) * rates[start - 1]
+        if window_cost < min_cost:
+            min_cost = window_cost
+            best_idx = start
+    return best_idx
+
+# Insert statements used by the writer thread, kept as constants so the
+# per-connection statement cache reuses the compiled statements
+INSERT_STATEMENTS = {
+    'energy_readings': """
+        INSERT INTO energy_readings 
+        (timestamp, device_id, power_consumption, voltage, current)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    'occupancy_data': """
+        INSERT INTO occupancy_data 
+        (room_id, occupancy_count, motion_detected, temperature)
+        VALUES (?, ?, ?, ?)
+    """,
+    'devices': """
+        INSERT OR IGNORE INTO devices (id, name) VALUES (?, ?)
+    """,
+    'rooms': """
+        INSERT OR IGNORE INTO rooms (id, name) VALUES (?, ?)
+    """,
+    'optimization_logs': """
+        INSERT INTO optimization_logs (optimization_type, devices_affected, estimated_savings)
+        VALUES (?, ?, ?)
+    """
+}
+
+# Read queries, also module constants so every call hits the statement cache
+HISTORY_QUERY = """
+    SELECT CAST(strftime('%s', timestamp) AS INTEGER) AS ts, power_consumption
+    FROM energy_readings 
+    WHERE timestamp BETWEEN ? AND ?
+    ORDER BY timestamp
+"""
+DAILY_REPORT_QUERY = """
+    SELECT 
+        substr(timestamp, 1, 10) as date,
+        SUM(power_consumption) as total_consumption,
+        AVG(power_consumption) as avg_consumption,
+        MAX(power_consumption) as peak_consumption,
+        COUNT(*) as reading_count
+    FROM energy_readings 
+    WHERE timestamp >= ? AND timestamp < ?
+    GROUP BY date
+    ORDER BY date
+"""
+
+# SQLite compiled-statement cache size per connection
+SQL_STATEMENT_CACHE_SIZE = 512
+
+# PRAGMA user_version of the normalized schema (integer device/room ids)
+SCHEMA_VERSION = 1
+
+# Tables whose text room/device columns are replaced by lookup ids in SCHEMA_VERSION 1
+LEGACY_TABLES = ('energy_readings', 'occupancy_data')
+
+# Row layout of the per-day aggregates used by generate_energy_report
+REPORT_ROW_DTYPE = [
+    ('date', 'O'),
+    ('total', 'f8'),
+    ('avg', 'f8'),
+    ('peak', 'f8'),
+    ('count', 'i8')
+]
+REPORT_FETCH_SIZE = 256
 
 class EnergyManagementSystem:
+    # Batched write settings
+    WRITE_BATCH_SIZE = 100
+    WRITE_FLUSH_INTERVAL = 1.0  # seconds
+    
+    # Batched anomaly scoring settings
+    ANOMALY_BATCH_SIZE = 32
+    ANOMALY_FLUSH_INTERVAL = 0.5  # seconds
+    ANOMALY_MIN_HISTORY = 10
+    MIN_ANOMALY_INTERVAL_NS = 200_000_000  # early scoring of a full batch at most every 200 ms
+    
+    # Minimum spacing between reading-driven optimization checks
+    MIN_TRIGGER_INTERVAL_NS = 500_000_000
+    
+    # Aggregated alert publishing settings
+    ALERT_BUFFER_SIZE = 256
+    ALERT_FLUSH_INTERVAL = 0.25  # seconds
+    
+    # Optimization log rows held back until a cycle finishes
+    LOG_BUFFER_SIZE = 64
+    
+    # Reading buffer sizes
+    MAX_DEVICES = 64  # initial capacity, grows on demand
+    HISTORY_SIZE = 1000
+    
+    # Rows above which features are built by the compiled kernel
+    FEATURE_JIT_THRESHOLD = 10_000
+    
+    # Maximum MQTT messages coalesced per processing batch
+    MESSAGE_BATCH_SIZE = 64
+
     def __init__(self, config_file="energy_config.json"):
         self.load_config(config_file)
         self.setup_logging()
@@ -39,14 +253,43 @@ class EnergyManagementSystem:
         self.initialize_mqtt()
         self.initialize_ml_models()
         
-        # Energy monitoring data
-        self.current_readings = {}
-        self.consumption_history = deque(maxlen=1000)
+        # Energy monitoring data, one NumPy column per reading field
+        self._dev_idx = {}
+        self._power = np.zeros(self.MAX_DEVICES, dtype=np.float32)
+        self._voltage = np.zeros(self.MAX_DEVICES, dtype=np.float32)
+        self._current = np.zeros(self.MAX_DEVICES, dtype=np.float32)
+        self._reading_ts = np.zeros(self.MAX_DEVICES, dtype=np.int64)  # time.time_ns()
+        self._total_load = 0.0  # running sum of self._power
+        
+        # Consumption history ring buffer
+        self._history_power = np.zeros(self.HISTORY_SIZE, dtype=np.float32)
+        self._history_dev = np.full(self.HISTORY_SIZE, -1, dtype=np.int32)
+        self._history_pos = 0
         self.device_power_ratings = {}
         self.optimization_schedule = {}
         self.peak_hours = []
         self.off_peak_hours = []
         
+        # Anomaly detection state
+        self.device_history = defaultdict(lambda: deque(maxlen=100))
+        self._anomaly_batch = []
+        self._anomaly_lock = threading.Lock()
+        self._anomaly_timer = None
+        self._last_anomaly_run_ns = 0
+        self._last_trigger_ns = 0
+        
+        # Alerts waiting to be published as one aggregated message
+        self._alert_ring = deque(maxlen=self.ALERT_BUFFER_SIZE)
+        self._alert_lock = threading.Lock()
+        self._alert_timer = None
+        
+        # Optimization log rows committed together at the end of a cycle
+        self._log_buffer = []
+        self._log_lock = threading.Lock()
+        
+        # Per-thread clock reading shared by everything in one optimization pass
+        self._tick = threading.local()
+        
         # Occupancy and environmental data
         self.occupancy_sensors = {}
         self.weather_data = {}
@@ -61,6 +304,10 @@ class EnergyManagementSystem:
         self.emergency_mode = False
         self.learning_mode = True
         
+        # Start processing queued MQTT messages now that state is ready
+        self._message_thread = threading.Thread(target=self._message_loop, daemon=True)
+        self._message_thread.start()
+        
         print("Advanced Energy Management System Initialized!")
         
     def load_config(self, config_file):
@@ -122,8 +369,108 @@ class EnergyManagementSystem:
                 }
             }
             
+        self.build_tariff_masks()
+        self.build_device_indexes()
+        self._control_topic = self.config["mqtt"]["topics"]["device_control"]
+        
+    def build_device_indexes(self):
+        """Precompute device lookups derived from the config"""
+        self._all_devices = [
+            device for devices in self.config['devices'].values() for device in devices
+        ]
+        
+        self._devices_by_room = defaultdict(list)
+        for device in self._all_devices:
+            self._devices_by_room[device.get('room')].append(device)
+            
+        # Higher priority = less essential, so those come first
+        self._non_essential_sorted = sorted(
+            (device for device in self._all_devices if not device.get('always_on', False)),
+            key=lambda device: device['priority'],
+            reverse=True
+        )
+        
+        # (id, power_rating, duration) of appliances worth moving to cheaper slots
+        self._schedulable_devices = [
+            (device['id'], device['power_rating'], device.get('duration', 2))  # Default 2 hours
+            for device in self.config['devices'].get('appliances', [])
+            if device['power_rating'] > 1000 and not device.get('always_on', False)
+        ]
+        
+        # Column arrays for vectorized device selection
+        self._room_names = sorted({device.get('room') for device in self._all_devices}, key=str)
+        room_slots = {room: i for i, room in enumerate(self._room_names)}
+        device_types = [
+            device_type
+            for device_type, devices in self.config['devices'].items() for _ in devices
+        ]
+        self._device_ids = np.array([device['id'] for device in self._all_devices], dtype=object)
+        self._device_room_idx = np.array(
+            [room_slots[device.get('room')] for device in self._all_devices], dtype=np.int64
+        )
+        self._device_is_light = np.array([t == 'lights' for t in device_types], dtype=bool)
+        self._device_is_fan = np.array([t == 'fans' for t in device_types], dtype=bool)
+        self._device_is_ac = np.array(
+            [t == 'appliances' and 'air_conditioner' in device['id']
+             for t, device in zip(device_types, self._all_devices)],
+            dtype=bool
+        )
+        
+    def build_tariff_masks(self):
+        """Precompute minute-of-day masks for the peak and off-peak tariff periods"""
+        self._peak_mask = self.build_minute_mask(self.config['tariff']['peak_hours'])
+        self._off_peak_mask = self.build_minute_mask(self.config['tariff']['off_peak_hours'])
+        
+        # 24-bit hour masks: bit h set if hour h is fully / partly inside the period
+        self._peak_full_bits, self._peak_partial_bits = self.build_hour_bits(self._peak_mask)
+        self._off_peak_full_bits, self._off_peak_partial_bits = self.build_hour_bits(self._off_peak_mask)
+        
+        # An hour takes the tariff covering most of its minutes (peak wins ties with off-peak)
+        tariff = self.config['tariff']
+        self._peak_hours = set(np.flatnonzero(self._peak_mask.reshape(24, 60).sum(axis=1) > 30).tolist())
+        self._off_peak_hours = set(np.flatnonzero(self._off_peak_mask.reshape(24, 60).sum(axis=1) > 30).tolist())
+        self._hour_rate_table = [
+            tariff['peak_rate'] if hour in self._peak_hours
+            else tariff['off_peak_rate'] if hour in self._off_peak_hours
+            else tariff['normal_rate']
+            for hour in range(24)
+        ]
+        self._hour_rate_array = np.array(self._hour_rate_table, dtype=np.float64)
+        
+    def build_hour_bits(self, minute_mask):
+        """Pack a minute-of-day mask into (fully covered, partly covered) hour bitmasks"""
+        minutes_per_hour = minute_mask.reshape(24, 60).sum(axis=1)
+        full_bits = 0
+        partial_bits = 0
+        for hour, minutes in enumerate(minutes_per_hour.tolist()):
+            if minutes == 60:
+                full_bits |= 1 << hour
+            elif minutes:
+                partial_bits |= 1 << hour
+        return full_bits, partial_bits
+        
+    def build_minute_mask(self, periods):
+        """Build a 1440-entry boolean mask covering the given HH:MM periods"""
+        mask = np.zeros(24 * 60, dtype=bool)
+        for period in periods:
+            start_hour, start_minute = map(int, period['start'].split(':'))
+            end_hour, end_minute = map(int, period['end'].split(':'))
+            start = start_hour * 60 + start_minute
+            end = end_hour * 60 + end_minute
+            
+            if start <= end:
+                mask[start:end + 1] = True
+            else:
+                # Period crosses midnight
+                mask[start:] = True
+                mask[:end + 1] = True
+        return mask
+        
     def setup_logging(self):
         """Setup logging system"""
+        # The format string uses neither, so skip collecting them per record
+        logging.logThreads = False
+        logging.logProcesses = False
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s',
@@ -137,22 +484,48 @@ class EnergyManagementSystem:
     def initialize_database(self):
         """Initialize SQLite database for energy data"""
         self.db_path = "energy_database.db"
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(self.db_path, cached_statements=SQL_STATEMENT_CACHE_SIZE)
         self.cursor = self.conn.cursor()
         
+        # Tune SQLite for high-frequency ingestion
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
+        self.cursor.execute("PRAGMA temp_store=MEMORY")
+        
+        # Per-thread read-only connections for queries
+        self._read_local = threading.local()
+        
         # Create tables
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rooms (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            )
+        """)
+        
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS devices (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL,
+                room TEXT,
+                device_type TEXT
+            )
+        """)
+        
+        # Move pre-normalization tables aside so the new layout can be created
+        self.rename_legacy_tables()
+        
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS energy_readings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                device_id TEXT,
+                device_id INTEGER,
                 power_consumption REAL,
                 voltage REAL,
                 current REAL,
                 power_factor REAL,
                 frequency REAL,
-                room TEXT,
-                device_type TEXT
+                FOREIGN KEY (device_id) REFERENCES devices (id)
             )
         """)
         
@@ -201,23 +574,214 @@ class EnergyManagementSystem:
             CREATE TABLE IF NOT EXISTS occupancy_data (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                room TEXT,
+                room_id INTEGER,
                 occupancy_count INTEGER,
                 motion_detected BOOLEAN,
                 light_level REAL,
                 temperature REAL,
-                humidity REAL
+                humidity REAL,
+                FOREIGN KEY (room_id) REFERENCES rooms (id)
             )
         """)
         
         self.conn.commit()
+        self.migrate_legacy_tables()
+        
+        # Indexes matching the per-device, time-range and per-room queries
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_readings_dev_ts
+            ON energy_readings (device_id, timestamp DESC)
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_readings_ts
+            ON energy_readings (timestamp)
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_occupancy_room_ts
+            ON occupancy_data (room_id, timestamp)
+        """)
+        
+        self.conn.commit()
+        
+        # Register configured devices and rooms in the lookup tables (one transaction)
+        with self.conn:
+            for device_type, devices in self.config['devices'].items():
+                for device in devices:
+                    self.cursor.execute("""
+                        INSERT OR IGNORE INTO devices (name, room, device_type) VALUES (?, ?, ?)
+                    """, (device['id'], device.get('room'), device_type))
+                    if device.get('room'):
+                        self.cursor.execute("""
+                            INSERT OR IGNORE INTO rooms (name) VALUES (?)
+                        """, (device['room'],))
+        
+        # In-memory name -> id maps used when writing readings
+        self._lookup_lock = threading.Lock()
+        self._lookup_ids = {
+            table: dict(self.cursor.execute(f"SELECT name, id FROM {table}").fetchall())
+            for table in ('devices', 'rooms')
+        }
+        
+        # Refresh planner statistics so the indexes are picked up
+        self.cursor.execute("ANALYZE")
+        
+        # All inserts go through a single writer thread with its own connection
+        self._write_q = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+        
+    def rename_legacy_tables(self):
+        """Rename tables still using text room/device columns to <table>_legacy"""
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+            
+        for table in LEGACY_TABLES:
+            columns = [row[1] for row in self.cursor.execute(f"PRAGMA table_info({table})")]
+            if 'room' in columns:
+                self.cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+                
+    def migrate_legacy_tables(self):
+        """Copy rows from renamed legacy tables into the id-based tables and drop them"""
+        legacy = {
+            row[0] for row in self.cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('energy_readings_legacy', 'occupancy_data_legacy')"
+            )
+        }
+        
+        with self.conn:
+            if 'energy_readings_legacy' in legacy:
+                self.cursor.execute("""
+                    INSERT OR IGNORE INTO devices (name, room, device_type)
+                    SELECT device_id, MIN(room), MIN(device_type)
+                    FROM energy_readings_legacy
+                    WHERE device_id IS NOT NULL
+                    GROUP BY device_id
+                """)
+                self.cursor.execute("""
+                    INSERT OR IGNORE INTO rooms (name)
+                    SELECT DISTINCT room FROM energy_readings_legacy WHERE room IS NOT NULL
+                """)
+                self.cursor.execute("""
+                    INSERT INTO energy_readings
+                    (id, timestamp, device_id, power_consumption, voltage, current, power_factor, frequency)
+                    SELECT legacy.id, legacy.timestamp, devices.id, legacy.power_consumption,
+                           legacy.voltage, legacy.current, legacy.power_factor, legacy.frequency
+                    FROM energy_readings_legacy AS legacy
+                    LEFT JOIN devices ON devices.name = legacy.device_id
+                """)
+                self.cursor.execute("DROP TABLE energy_readings_legacy")
+                
+            if 'occupancy_data_legacy' in legacy:
+                self.cursor.execute("""
+                    INSERT OR IGNORE INTO rooms (name)
+                    SELECT DISTINCT room FROM occupancy_data_legacy WHERE room IS NOT NULL
+                """)
+                self.cursor.execute("""
+                    INSERT INTO occupancy_data
+                    (id, timestamp, room_id, occupancy_count, motion_detected, light_level, temperature, humidity)
+                    SELECT legacy.id, legacy.timestamp, rooms.id, legacy.occupancy_count,
+                           legacy.motion_detected, legacy.light_level, legacy.temperature, legacy.humidity
+                    FROM occupancy_data_legacy AS legacy
+                    LEFT JOIN rooms ON rooms.name = legacy.room
+                """)
+                self.cursor.execute("DROP TABLE occupancy_data_legacy")
+                
+            self.cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            
+    def queue_write(self, table, row):
+        """Queue a row for insertion by the database writer thread"""
+        self._write_q.put((INSERT_STATEMENTS[table], [row]))
+        
+    def queue_write_many(self, table, rows):
+        """Queue rows that must be committed in the same transaction"""
+        self._write_q.put((INSERT_STATEMENTS[table], rows))
+        
+    def get_lookup_id(self, table, name):
+        """Get the integer id for a device or room name, registering new names"""
+        if name is None:
+            return None
+            
+        ids = self._lookup_ids[table]
+        lookup_id = ids.get(name)
+        if lookup_id is None:
+            with self._lookup_lock:
+                lookup_id = ids.get(name)
+                if lookup_id is None:
+                    lookup_id = max(ids.values(), default=0) + 1
+                    ids[name] = lookup_id
+                    # Queued ahead of the row that references it
+                    self.queue_write(table, (lookup_id, name))
+        return lookup_id
+        
+    def _writer_loop(self):
+        """Drain the write queue, committing every N rows or T seconds"""
+        # Autocommit mode with explicit transactions around each batch
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=SQL_STATEMENT_CACHE_SIZE,
+            isolation_level=None
+        )
+        conn.execute("PRAGMA synchronous=NORMAL")
+        
+        running = True
+        while running:
+            item = self._write_q.get()
+            if item is None:
+                break
+                
+            batch = [item]
+            deadline = time.monotonic() + self.WRITE_FLUSH_INTERVAL
+            while len(batch) < self.WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._write_q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+                
+            try:
+                conn.execute("BEGIN")
+                # Consecutive rows for the same statement share one executemany
+                for sql, entries in groupby(batch, key=lambda entry: entry[0]):
+                    conn.executemany(sql, [params for _, rows in entries for params in rows])
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self.logger.error(f"Batched database write error: {e}")
+                
+        conn.close()
+        
+    def get_read_connection(self):
+        """Get this thread's read-only database connection"""
+        conn = getattr(self._read_local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{self.db_path}?mode=ro",
+                uri=True,
+                cached_statements=SQL_STATEMENT_CACHE_SIZE
+            )
+            self._read_local.conn = conn
+        return conn
         
     def initialize_mqtt(self):
         """Initialize MQTT communication"""
+        self._message_q = queue.SimpleQueue()
         self.mqtt_client = mqtt.Client()
         self.mqtt_client.on_connect = self.on_mqtt_connect
         self.mqtt_client.on_message = self.on_mqtt_message
         
+        # Device commands are published from a dedicated thread
+        self._pub_q = queue.SimpleQueue()
+        self._publisher_thread = threading.Thread(target=self._publisher_loop, daemon=True)
+        self._publisher_thread.start()
+        
         try:
             self.mqtt_client.connect(
                 self.config["mqtt"]["broker"],
@@ -229,6 +793,17 @@ class EnergyManagementSystem:
         except Exception as e:
             self.logger.error(f"MQTT connection error: {e}")
             
+    def _publisher_loop(self):
+        """Publish queued (topic, payload) pairs until the None sentinel"""
+        while True:
+            item = self._pub_q.get()
+            if item is None:
+                break
+            try:
+                self.mqtt_client.publish(*item)
+            except Exception as e:
+                self.logger.error(f"MQTT publish error: {e}")
+                
     def initialize_ml_models(self):
         """Initialize machine learning models for energy prediction and optimization"""
         try:
@@ -249,10 +824,10 @@ class EnergyManagementSystem:
             
     def load_or_create_model(self, model_name):
         """Load existing ML model or create a new one"""
-        model_path = f"models/{model_name}.pkl"
         try:
-            if os.path.exists(model_path):
-                return joblib.load(model_path)
+            model = self.load_model_file(model_name)
+            if model is not None:
+                return model
             else:
                 # Create new model based on type
                 if model_name == 'consumption_predictor':
@@ -270,16 +845,46 @@ class EnergyManagementSystem:
             
     def load_or_create_scaler(self):
         """Load existing scaler or create new one"""
-        scaler_path = "models/feature_scaler.pkl"
         try:
-            if os.path.exists(scaler_path):
-                return joblib.load(scaler_path)
+            scaler = self.load_model_file('feature_scaler')
+            if scaler is not None:
+                return scaler
             else:
                 return StandardScaler()
         except Exception as e:
             self.logger.error(f"Error loading/creating scaler: {e}")
             return StandardScaler()
             
+    def load_model_file(self, model_name):
+        """Load a persisted model, or None if it has not been saved yet"""
+        compressed_path = f"models/{model_name}.pkl.lz4"
+        if os.path.exists(compressed_path):
+            return joblib.load(compressed_path)
+            
+        # Uncompressed files are memory-mapped so arrays are paged in on demand
+        model_path = f"models/{model_name}.pkl"
+        if os.path.exists(model_path):
+            return joblib.load(model_path, mmap_mode='r')
+            
+        return None
+        
+    def save_model(self, model_name, model):
+        """Persist a model fitted in this process, LZ4-compressed when lz4 is installed"""
+        # An unfitted estimator must never replace a trained one on disk
+        check_is_fitted(model)
+        
+        os.makedirs("models", exist_ok=True)
+        if LZ4_AVAILABLE:
+            path, stale_path = f"models/{model_name}.pkl.lz4", f"models/{model_name}.pkl"
+            joblib.dump(model, path, compress=('lz4', 3))
+        else:
+            path, stale_path = f"models/{model_name}.pkl", f"models/{model_name}.pkl.lz4"
+            joblib.dump(model, path)
+            
+        # load_model_file must not pick up an older copy in the other format
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+            
     def on_mqtt_connect(self, client, userdata, flags, rc):
         """MQTT connection callback"""
         if rc == 0:
@@ -294,64 +899,112 @@ class EnergyManagementSystem:
     def on_mqtt_message(self, client, userdata, msg):
         """MQTT message callback"""
         try:
-            topic = msg.topic
-            message = json.loads(msg.payload.decode())
-            
-            if topic == self.config["mqtt"]["topics"]["energy_data"]:
-                self.process_energy_reading(message)
-            elif topic == "smarthome/status":
-                self.process_device_status(message)
-            elif "occupancy" in topic:
-                self.process_occupancy_data(message)
-            elif topic == "weather/current":
-                self.process_weather_data(message)
-                
+            self._message_q.put((msg.topic, json_loads(msg.payload)))
         except Exception as e:
-            self.logger.error(f"MQTT message processing error: {e}")
+            self.logger.error(f"MQTT message decode error: {e}")
             
+    def _message_loop(self):
+        """Process queued MQTT messages, coalescing bursts of energy readings"""
+        energy_topic = self.config["mqtt"]["topics"]["energy_data"]
+        
+        while True:
+            batch = [self._message_q.get()]
+            while len(batch) < self.MESSAGE_BATCH_SIZE:
+                try:
+                    batch.append(self._message_q.get_nowait())
+                except queue.Empty:
+                    break
+                    
+            readings = []
+            for topic, message in batch:
+                try:
+                    if topic == energy_topic:
+                        readings.append(message)
+                    elif topic == "smarthome/status":
+                        self.process_device_status(message)
+                    elif "occupancy" in topic:
+                        self.process_occupancy_data(message)
+                    elif topic == "weather/current":
+                        self.process_weather_data(message)
+                        
+                except Exception as e:
+                    self.logger.error(f"MQTT message processing error: {e}")
+                    
+            if readings:
+                self.process_energy_reading_batch(readings)
+                
     def process_energy_reading(self, data):
         """Process energy consumption reading"""
+        self.process_energy_reading_batch([data])
+        
+    def process_energy_reading_batch(self, batch):
+        """Process a batch of energy consumption readings"""
+        # One clock read per batch; the ISO string is only built if a reading lacks one
+        now_ns = time.time_ns()
+        now_iso = None
+        
+        for data in batch:
+            try:
+                timestamp = data.get('timestamp')
+                if timestamp is None:
+                    if now_iso is None:
+                        now_iso = datetime.fromtimestamp(now_ns / 1e9).isoformat()
+                    timestamp = now_iso
+                device_id = data.get('device_id')
+                power = data.get('power_consumption', 0.0)
+                voltage = data.get('voltage', 0.0)
+                current = data.get('current', 0.0)
+                
+                # Store in database
+                self.queue_write('energy_readings', (
+                    timestamp, self.get_lookup_id('devices', device_id), power, voltage, current
+                ))
+                
+                # Update current readings
+                idx = self.get_device_index(device_id)
+                previous_power = float(self._power[idx])
+                self._power[idx] = power
+                self._total_load += float(self._power[idx]) - previous_power
+                self._voltage[idx] = voltage
+                self._current[idx] = current
+                self._reading_ts[idx] = now_ns
+                
+                # Add to consumption history
+                slot = self._history_pos % self.HISTORY_SIZE
+                self._history_power[slot] = power
+                self._history_dev[slot] = idx
+                self._history_pos += 1
+                
+                # Check for anomalies
+                self.detect_energy_anomalies(device_id, power)
+                
+            except Exception as e:
+                self.logger.error(f"Error processing energy reading: {e}")
+                
         try:
-            timestamp = data.get('timestamp', datetime.now().isoformat())
-            device_id = data.get('device_id')
-            power = data.get('power_consumption', 0.0)
-            voltage = data.get('voltage', 0.0)
-            current = data.get('current', 0.0)
-            
-            # Store in database
-            self.cursor.execute("""
-                INSERT INTO energy_readings 
-                (timestamp, device_id, power_consumption, voltage, current)
-                VALUES (?, ?, ?, ?, ?)
-            """, (timestamp, device_id, power, voltage, current))
-            
-            self.conn.commit()
-            
-            # Update current readings
-            self.current_readings[device_id] = {
-                'timestamp': timestamp,
-                'power': power,
-                'voltage': voltage,
-                'current': current
-            }
-            
-            # Add to consumption history
-            self.consumption_history.append({
-                'timestamp': timestamp,
-                'device_id': device_id,
-                'power': power
-            })
-            
-            # Check for anomalies
-            self.detect_energy_anomalies(device_id, power)
-            
-            # Trigger optimization if needed
-            if self.auto_optimization_enabled:
+            # Trigger optimization if needed, at most once per interval
+            if (self.auto_optimization_enabled and
+                    now_ns - self._last_trigger_ns > self.MIN_TRIGGER_INTERVAL_NS):
+                self._last_trigger_ns = now_ns
                 self.check_optimization_triggers()
                 
         except Exception as e:
             self.logger.error(f"Error processing energy reading: {e}")
             
+    def get_device_index(self, device_id):
+        """Get the reading buffer slot for a device, growing the buffers if full"""
+        idx = self._dev_idx.get(device_id)
+        if idx is None:
+            idx = len(self._dev_idx)
+            capacity = self._power.shape[0]
+            if idx >= capacity:
+                self._power = np.concatenate((self._power, np.zeros(capacity, dtype=np.float32)))
+                self._voltage = np.concatenate((self._voltage, np.zeros(capacity, dtype=np.float32)))
+                self._current = np.concatenate((self._current, np.zeros(capacity, dtype=np.float32)))
+                self._reading_ts = np.concatenate((self._reading_ts, np.zeros(capacity, dtype=np.int64)))
+            self._dev_idx[device_id] = idx
+        return idx
+        
     def process_device_status(self, data):
         """Process device status updates"""
         try:
@@ -377,17 +1030,13 @@ class EnergyManagementSystem:
                 'occupancy_count': occupancy_count,
                 'motion_detected': motion_detected,
                 'temperature': temperature,
-                'timestamp': datetime.now()
+                'timestamp': time.time_ns()
             }
             
             # Store in database
-            self.cursor.execute("""
-                INSERT INTO occupancy_data 
-                (room, occupancy_count, motion_detected, temperature)
-                VALUES (?, ?, ?, ?)
-            """, (room, occupancy_count, motion_detected, temperature))
-            
-            self.conn.commit()
+            self.queue_write('occupancy_data', (
+                self.get_lookup_id('rooms', room), occupancy_count, motion_detected, temperature
+            ))
             
             # Trigger occupancy-based optimization
             self.optimize_based_on_occupancy(room)
@@ -413,33 +1062,58 @@ class EnergyManagementSystem:
             self.logger.error(f"Error processing weather data: {e}")
             
     def detect_energy_anomalies(self, device_id, current_power):
-        """Detect energy consumption anomalies using ML"""
+        """Queue a reading for ML anomaly detection"""
         try:
             if self.ml_models['anomaly_detector'] is None:
                 return
                 
-            # Get historical data for this device
-            self.cursor.execute("""
-                SELECT power_consumption FROM energy_readings 
-                WHERE device_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT 100
-            """, (device_id,))
-            
-            historical_data = [row[0] for row in self.cursor.fetchall()]
+            history = self.device_history[device_id]
+            history.append(current_power)
             
-            if len(historical_data) < 10:
+            if len(history) < self.ANOMALY_MIN_HISTORY:
                 return  # Not enough data for anomaly detection
                 
-            # Prepare features
-            features = np.array(historical_data).reshape(-1, 1)
+            with self._anomaly_lock:
+                self._anomaly_batch.append((device_id, current_power))
+                pending = len(self._anomaly_batch)
+                
+                if self._anomaly_timer is None:
+                    self._anomaly_timer = threading.Timer(self.ANOMALY_FLUSH_INTERVAL, self.score_anomaly_batch)
+                    self._anomaly_timer.daemon = True
+                    self._anomaly_timer.start()
+                    
+            # Full batches are scored early unless a run just happened;
+            # otherwise the timer picks them up
+            if (pending >= self.ANOMALY_BATCH_SIZE and
+                    time.time_ns() - self._last_anomaly_run_ns > self.MIN_ANOMALY_INTERVAL_NS):
+                self.score_anomaly_batch()
+                
+        except Exception as e:
+            self.logger.error(f"Anomaly detection error: {e}")
+            
+    def score_anomaly_batch(self):
+        """Score all queued readings with a single model call"""
+        with self._anomaly_lock:
+            if self._anomaly_timer is not None:
+                self._anomaly_timer.cancel()
+                self._anomaly_timer = None
+            batch, self._anomaly_batch = self._anomaly_batch, []
+            self._last_anomaly_run_ns = time.time_ns()
             
-            # Detect anomaly
-            anomaly_score = self.ml_models['anomaly_detector'].decision_function([[current_power]])
-            is_anomaly = self.ml_models['anomaly_detector'].predict([[current_power]])[0] == -1
+        if not batch:
+            return
             
-            if is_anomaly:
-                self.handle_energy_anomaly(device_id, current_power, anomaly_score[0])
+        try:
+            detector = self.ml_models['anomaly_detector']
+            samples = np.asarray([power for _, power in batch], dtype=np.float64).reshape(-1, 1)
+            
+            # Detect anomalies
+            anomaly_scores = detector.decision_function(samples)
+            anomalies = np.flatnonzero(detector.predict(samples) == -1)
+            
+            for i in anomalies:
+                device_id, power = batch[i]
+                self.handle_energy_anomaly(device_id, power, anomaly_scores[i])
                 
         except Exception as e:
             self.logger.error(f"Anomaly detection error: {e}")
@@ -447,7 +1121,7 @@ class EnergyManagementSystem:
     def handle_energy_anomaly(self, device_id, power, anomaly_score):
         """Handle detected energy anomaly"""
         try:
-            self.logger.warning(f"Energy anomaly detected: {device_id} consuming {power}W (score: {anomaly_score})")
+            self.logger.warning("Energy anomaly detected: %s consuming %sW (score: %s)", device_id, power, anomaly_score)
             
             # Send alert
             alert_data = {
@@ -459,10 +1133,12 @@ class EnergyManagementSystem:
                 'severity': 'medium' if abs(anomaly_score) < 0.5 else 'high'
             }
             
-            self.mqtt_client.publish(
-                self.config["mqtt"]["topics"]["alerts"],
-                json.dumps(alert_data)
-            )
+            with self._alert_lock:
+                self._alert_ring.append(alert_data)
+                if self._alert_timer is None:
+                    self._alert_timer = threading.Timer(self.ALERT_FLUSH_INTERVAL, self.flush_alerts)
+                    self._alert_timer.daemon = True
+                    self._alert_timer.start()
             
             # Automatic action for severe anomalies
             if abs(anomaly_score) > 0.7:
@@ -471,100 +1147,177 @@ class EnergyManagementSystem:
         except Exception as e:
             self.logger.error(f"Error handling energy anomaly: {e}")
             
+    def flush_alerts(self):
+        """Publish all buffered alerts as a single JSON array"""
+        with self._alert_lock:
+            self._alert_timer = None
+            alerts = list(self._alert_ring)
+            self._alert_ring.clear()
+            
+        if not alerts:
+            return
+            
+        try:
+            self.mqtt_client.publish(
+                self.config["mqtt"]["topics"]["alerts"],
+                json_dumps(alerts),
+                qos=0
+            )
+        except Exception as e:
+            self.logger.error(f"Error publishing alerts: {e}")
+            
     def predict_energy_consumption(self, hours_ahead=24):
         """Predict energy consumption for the next N hours"""
+        forecast = self.predict_energy_arrays(hours_ahead)
+        if forecast is None:
+            return None
+            
+        first_time, _, loads = forecast
+        prediction_times = [first_time + timedelta(hours=i) for i in range(len(loads))]
+        return list(zip(prediction_times, loads.tolist()))
+        
+    def predict_energy_arrays(self, hours_ahead=24):
+        """Predict the next N hours as (first timestamp, hour-of-day array, load array)"""
         try:
-            if self.ml_models['consumption_predictor'] is None:
-                return None
+            predictor = self.ml_models.get('consumption_predictor')
                 
             # Get historical data
-            end_time = datetime.now()
+            end_time = self.current_time()
             start_time = end_time - timedelta(days=30)
             
-            self.cursor.execute("""
-                SELECT timestamp, power_consumption FROM energy_readings 
-                WHERE timestamp BETWEEN ? AND ?
-                ORDER BY timestamp
-            """, (start_time.isoformat(), end_time.isoformat()))
+            readings = pd.read_sql_query(
+                HISTORY_QUERY, self.get_read_connection(),
+                params=(start_time.isoformat(), end_time.isoformat()),
+                dtype={'power_consumption': 'float32'}
+            )
             
-            data = self.cursor.fetchall()
-            if len(data) < 100:
+            if len(readings) < 100:
                 return None
                 
-            # Prepare features
-            df = pd.DataFrame(data, columns=['timestamp', 'power'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.set_index('timestamp')
-            
-            # Resample to hourly data
-            hourly_data = df.resample('H').mean()
-            
-            # Create features
-            features = self.create_prediction_features(hourly_data)
-            
-            # Scale features
-            features_scaled = self.scaler.transform(features)
+            readings = readings.dropna()
+            
+            # Bin readings into hourly means
+            hours = readings['ts'].to_numpy(dtype=np.int64) // 3600
+            first_hour = hours.min()
+            buckets = hours - first_hour
+            hourly_power = (
+                np.bincount(buckets, weights=readings['power_consumption'].to_numpy()) /
+                np.maximum(np.bincount(buckets), 1)
+            )
             
-            # Make predictions
-            predictions = self.ml_models['consumption_predictor'].predict(features_scaled[-hours_ahead:])
+            if predictor is None:
+                # Fall back to a statistical forecast of the hourly series
+                predictions = self.forecast_arima(hourly_power, hours_ahead)
+            else:
+                hourly_index = pd.to_datetime((first_hour + np.arange(len(hourly_power))) * 3600, unit='s')
+                hourly_data = pd.DataFrame({'power': hourly_power}, index=hourly_index)
+                
+                # Create features
+                features = self.create_prediction_features(hourly_data)
+                
+                # Scale features
+                features_scaled = self.scaler.transform(features)
+                
+                # Make predictions
+                predictions = predictor.predict(features_scaled[-hours_ahead:])
             
-            # Create prediction timestamps
-            prediction_times = [end_time + timedelta(hours=i+1) for i in range(hours_ahead)]
+            # Hourly slots start one hour from now
+            loads = np.asarray(predictions, dtype=np.float32)
+            first_time = end_time + timedelta(hours=1)
+            hours = ((first_time.hour + np.arange(len(loads))) % 24).astype(np.int8)
             
-            return list(zip(prediction_times, predictions))
+            return first_time, hours, loads
             
         except Exception as e:
             self.logger.error(f"Energy prediction error: {e}")
             return None
             
+    def forecast_arima(self, series, steps, order=(2, 0, 1)):
+        """Forecast the next N values of a series with an ARIMA(p, d, q) model"""
+        y = np.asarray(series, dtype=np.float64)
+        y = y[~np.isnan(y)]
+        
+        if not NUMBA_AVAILABLE:
+            # statsmodels is only imported when it is actually needed
+            from statsmodels.tsa.arima.model import ARIMA
+            return np.asarray(ARIMA(y, order=order).fit().forecast(steps))
+            
+        p, d, q = order
+        
+        # Difference up front so the compiled kernels only fit ARMA(p, q)
+        last_values = []
+        for _ in range(d):
+            last_values.append(y[-1])
+            y = np.diff(y)
+            
+        mean = y.mean()
+        centered = y - mean
+        
+        result = minimize(_arma_loss, np.zeros(p + q), args=(centered, p, q), method='Nelder-Mead')
+        phi, theta = result.x[:p], result.x[p:]
+        
+        residuals = _arma_residuals(centered, phi, theta)
+        forecast = _arma_forecast(centered, residuals, phi, theta, steps) + mean
+        
+        # Undo differencing
+        for last_value in reversed(last_values):
+            forecast = last_value + np.cumsum(forecast)
+            
+        return forecast
+        
     def create_prediction_features(self, df):
         """Create features for energy prediction"""
         try:
-            features = []
-            
-            for i in range(len(df)):
-                feature_row = []
-                
-                # Time-based features
-                timestamp = df.index[i]
-                feature_row.extend([
-                    timestamp.hour,
-                    timestamp.day,
-                    timestamp.month,
-                    timestamp.weekday(),
-                    1 if timestamp.weekday() >= 5 else 0  # Weekend flag
-                ])
-                
-                # Historical consumption features
-                if i >= 24:  # Previous day same hour
-                    feature_row.append(df.iloc[i-24]['power'])
-                else:
-                    feature_row.append(0)
-                    
-                if i >= 7*24:  # Previous week same hour
-                    feature_row.append(df.iloc[i-7*24]['power'])
-                else:
-                    feature_row.append(0)
-                    
-                # Moving averages
-                if i >= 6:
-                    feature_row.append(df.iloc[i-6:i]['power'].mean())  # 6-hour average
-                else:
-                    feature_row.append(df.iloc[:i+1]['power'].mean())
-                    
-                # Weather features (if available)
-                if self.weather_data:
-                    feature_row.extend([
-                        self.weather_data.get('temperature', 20),
-                        self.weather_data.get('humidity', 50),
-                        self.weather_data.get('cloud_cover', 50)
-                    ])
-                else:
-                    feature_row.extend([20, 50, 50])  # Default values
-                    
-                features.append(feature_row)
+            index = df.index
+            power = df['power']
+            
+            if NUMBA_AVAILABLE and len(df) > self.FEATURE_JIT_THRESHOLD:
+                weather = self.weather_data or {}
+                return _build_features(
+                    power.to_numpy(dtype=np.float64),
+                    index.hour.to_numpy(),
+                    index.day.to_numpy(),
+                    index.month.to_numpy(),
+                    index.weekday.to_numpy(),
+                    float(weather.get('temperature', 20)),
+                    float(weather.get('humidity', 50)),
+                    float(weather.get('cloud_cover', 50))
+                )
+                
+            features = pd.DataFrame(index=index)
+            
+            # Time-based features
+            features['hour'] = index.hour
+            features['day'] = index.day
+            features['month'] = index.month
+            features['weekday'] = index.weekday
+            features['weekend'] = (index.weekday >= 5).astype(int)
+            
+            # Historical consumption features (previous day / previous week same hour)
+            lag_24 = power.shift(24)
+            lag_24.iloc[:24] = 0
+            features['lag_24'] = lag_24
+            
+            lag_168 = power.shift(7*24)
+            lag_168.iloc[:7*24] = 0
+            features['lag_168'] = lag_168
+            
+            # Moving averages: previous 6 hours, or everything so far for the first rows
+            moving_avg = power.shift(1).rolling(6, min_periods=1).mean()
+            moving_avg.iloc[:6] = power.expanding().mean().iloc[:6]
+            features['moving_avg_6h'] = moving_avg
+            
+            # Weather features (if available)
+            if self.weather_data:
+                features['temperature'] = self.weather_data.get('temperature', 20)
+                features['humidity'] = self.weather_data.get('humidity', 50)
+                features['cloud_cover'] = self.weather_data.get('cloud_cover', 50)
+            else:
+                features['temperature'] = 20  # Default values
+                features['humidity'] = 50
+                features['cloud_cover'] = 50
                 
-            return np.array(features)
+            return features.to_numpy()
             
         except Exception as e:
             self.logger.error(f"Feature creation error: {e}")
@@ -573,6 +1326,7 @@ class EnergyManagementSystem:
     def optimize_based_on_occupancy(self, room):
         """Optimize energy usage based on occupancy"""
         try:
+            now_ns = time.time_ns()
             occupancy = self.occupancy_sensors.get(room, {})
             is_occupied = occupancy.get('motion_detected', False) or occupancy.get('occupancy_count', 0) > 0
             
@@ -595,8 +1349,8 @@ class EnergyManagementSystem:
                             self.control_device(device['id'], False)
                     else:
                         # Turn off fan if room unoccupied for > 10 minutes
-                        last_activity = occupancy.get('timestamp', datetime.now())
-                        if (datetime.now() - last_activity).seconds > 600:
+                        last_activity = occupancy.get('timestamp', now_ns)
+                        if now_ns - last_activity > 600_000_000_000:
                             self.control_device(device['id'], False)
                             self.log_optimization('occupancy_based', device['id'], 'fan_auto_off')
                             
@@ -613,55 +1367,60 @@ class EnergyManagementSystem:
             humidity = self.weather_data.get('humidity', 50)
             cloud_cover = self.weather_data.get('cloud_cover', 50)
             
+            # Occupancy of each device's room
+            occupied = np.array(
+                [self.is_room_occupied(room) for room in self._room_names], dtype=bool
+            )[self._device_room_idx]
+            
             # Natural lighting optimization
             if cloud_cover < 30 and self.is_daytime():
                 # Good natural light available
-                for device in self.config['devices']['lights']:
-                    room = device['room']
-                    if not self.is_room_occupied(room):
-                        self.control_device(device['id'], False)
-                        self.log_optimization('weather_based', device['id'], 'natural_light_available')
+                self.apply_device_mask(
+                    self._device_is_light & ~occupied, False, 'natural_light_available'
+                )
                         
             # Temperature-based fan/AC optimization
             if outdoor_temp < 20:
                 # Cool weather - reduce fan usage
-                for device in self.config['devices']['fans']:
-                    room = device['room']
-                    if not self.is_room_occupied(room):
-                        self.control_device(device['id'], False)
-                        self.log_optimization('weather_based', device['id'], 'cool_weather_optimization')
+                self.apply_device_mask(
+                    self._device_is_fan & ~occupied, False, 'cool_weather_optimization'
+                )
                         
             elif outdoor_temp > 35:
-                # Hot weather - predictive cooling
-                for device in self.config['devices']['appliances']:
-                    if 'air_conditioner' in device['id']:
-                        # Pre-cool before peak hours
-                        if not self.is_peak_hour() and self.is_room_occupied(device['room']):
-                            self.control_device(device['id'], True)
-                            self.log_optimization('weather_based', device['id'], 'predictive_cooling')
+                # Hot weather - pre-cool occupied rooms before peak hours
+                if not self.is_peak_hour():
+                    self.apply_device_mask(
+                        self._device_is_ac & occupied, True, 'predictive_cooling'
+                    )
                             
         except Exception as e:
             self.logger.error(f"Weather-based optimization error: {e}")
             
+    def apply_device_mask(self, mask, state, description):
+        """Switch every device selected by a boolean mask with one control message"""
+        device_ids = self._device_ids[mask].tolist()
+        if not device_ids:
+            return
+            
+        self.control_device_batch(device_ids, state)
+        for device_id in device_ids:
+            self.log_optimization('weather_based', device_id, description)
+            
     def optimize_load_balancing(self):
         """Optimize load balancing to prevent peak demand"""
         try:
-            current_total_load = sum(
-                reading.get('power', 0) for reading in self.current_readings.values()
-            )
+            current_total_load = self._total_load
             
             max_safe_load = self.config['thresholds']['high_usage_alert']
             
             if current_total_load > max_safe_load * 0.8:
                 # Approaching high usage threshold
-                self.logger.info(f"High load detected: {current_total_load}W, initiating load balancing")
+                self.logger.info("High load detected: %sW, initiating load balancing", current_total_load)
                 
-                # Get non-essential devices that can be temporarily turned off
+                # Get non-essential devices that can be temporarily turned off,
+                # already sorted by priority (higher priority = less essential)
                 non_essential_devices = self.get_non_essential_devices()
                 
-                # Sort by priority (higher priority = less essential)
-                non_essential_devices.sort(key=lambda x: x['priority'], reverse=True)
-                
                 load_to_reduce = current_total_load - (max_safe_load * 0.7)
                 reduced_load = 0
                 
@@ -684,9 +1443,10 @@ class EnergyManagementSystem:
     def optimize_cost_efficiency(self):
         """Optimize for cost efficiency based on time-of-use tariffs"""
         try:
-            current_hour = datetime.now().hour
-            is_peak = self.is_peak_hour()
-            is_off_peak = self.is_off_peak_hour()
+            now = self.current_time()
+            current_hour = now.hour
+            is_peak = self.is_peak_hour(now)
+            is_off_peak = self.is_off_peak_hour(now)
             
             if is_peak:
                 # Peak hours - minimize usage
@@ -714,50 +1474,44 @@ class EnergyManagementSystem:
         """Implement smart scheduling based on predictions and patterns"""
         try:
             # Get energy predictions
-            predictions = self.predict_energy_consumption(24)
-            if not predictions:
+            forecast = self.predict_energy_arrays(24)
+            if forecast is None:
                 return
                 
             # Find optimal time slots for high-power appliances
-            high_power_devices = [
-                device for device in self.config['devices']['appliances']
-                if device['power_rating'] > 1000 and not device.get('always_on', False)
-            ]
-            
-            for device in high_power_devices:
-                optimal_time = self.find_optimal_time_slot(
-                    predictions,
-                    device['power_rating'],
-                    device.get('duration', 2)  # Default 2 hours
-                )
+            for device_id, power_rating, duration in self._schedulable_devices:
+                optimal_time = self.find_optimal_time_slot(forecast, power_rating, duration)
                 
                 if optimal_time:
-                    self.schedule_device_operation(device['id'], optimal_time)
-                    self.log_optimization('smart_scheduling', device['id'], f'scheduled_for_{optimal_time}')
+                    self.schedule_device_operation(device_id, optimal_time)
+                    self.log_optimization('smart_scheduling', device_id, f'scheduled_for_{optimal_time}')
                     
         except Exception as e:
             self.logger.error(f"Smart scheduling error: {e}")
             
-    def find_optimal_time_slot(self, predictions, device_power, duration_hours):
+    def find_optimal_time_slot(self, forecast, device_power, duration_hours):
         """Find optimal time slot for device operation"""
         try:
-            min_cost = float('inf')
-            optimal_time = None
+            first_time, hours, loads = forecast
+            
+            # Candidate start slots, as before: range(len(predictions) - duration_hours)
+            slot_count = len(loads) - duration_hours
+            if duration_hours < 1 or slot_count < 1:
+                return None
+                
+            rates = self._hour_rate_array[hours]
             
-            for i in range(len(predictions) - duration_hours):
-                time_slot = predictions[i:i+duration_hours]
+            if NUMBA_AVAILABLE:
+                best_idx = _min_window_cost(loads, rates, float(device_power), duration_hours)
+                return first_time + timedelta(hours=int(best_idx))
                 
-                # Calculate cost for this time slot
-                total_cost = 0
-                for timestamp, predicted_load in time_slot:
-                    hourly_rate = self.get_hourly_rate(timestamp.hour)
-                    total_cost += (predicted_load + device_power) * hourly_rate / 1000  # Convert W to kW
-                    
-                if total_cost < min_cost:
-                    min_cost = total_cost
-                    optimal_time = time_slot[0][0]
-                    
-            return optimal_time
+            hourly_cost = (loads + device_power) * rates / 1000  # Convert W to kW
+            
+            # Sliding-window cost sums from cumulative sum differences
+            cumulative = np.concatenate(([0.0], np.cumsum(hourly_cost)))
+            window_costs = cumulative[duration_hours:duration_hours + slot_count] - cumulative[:slot_count]
+            
+            return first_time + timedelta(hours=int(window_costs.argmin()))
             
         except Exception as e:
             self.logger.error(f"Error finding optimal time slot: {e}")
@@ -766,19 +1520,39 @@ class EnergyManagementSystem:
     def control_device(self, device_id, state):
         """Control device state"""
         try:
-            command_data = {
+            payload = json_dumps({
                 'device_id': device_id,
                 'command': 'on' if state else 'off',
                 'timestamp': datetime.now().isoformat(),
                 'source': 'energy_management'
-            }
+            })
             
-            self.mqtt_client.publish(
-                self.config["mqtt"]["topics"]["device_control"],
-                json.dumps(command_data)
-            )
+            self._pub_q.put((self._control_topic, payload))
             
-            self.logger.info(f"Device control: {device_id} -> {'ON' if state else 'OFF'}")
+            self.logger.info("Device control: %s -> %s", device_id, 'ON' if state else 'OFF')
+            
+        except Exception as e:
+            self.logger.error(f"Device control error: {e}")
+            
+    def control_device_batch(self, device_ids, state):
+        """Control several devices with a single MQTT message"""
+        try:
+            command = 'on' if state else 'off'
+            timestamp = datetime.now().isoformat()
+            commands = [
+                {
+                    'device_id': device_id,
+                    'command': command,
+                    'timestamp': timestamp,
+                    'source': 'energy_management'
+                }
+                for device_id in device_ids
+            ]
+            
+            self._pub_q.put((self._control_topic, json_dumps(commands)))
+            
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Device control: %s -> %s", ', '.join(device_ids), 'ON' if state else 'OFF')
             
         except Exception as e:
             self.logger.error(f"Device control error: {e}")
@@ -786,18 +1560,24 @@ class EnergyManagementSystem:
     def log_optimization(self, optimization_type, device_id, description):
         """Log optimization action"""
         try:
-            self.cursor.execute("""
-                INSERT INTO optimization_logs (optimization_type, devices_affected, estimated_savings)
-                VALUES (?, ?, ?)
-            """, (optimization_type, device_id, 0.0))  # TODO: Calculate actual savings
-            
-            self.conn.commit()
+            with self._log_lock:
+                self._log_buffer.append((optimization_type, device_id, 0.0))  # TODO: Calculate actual savings
+                full = len(self._log_buffer) >= self.LOG_BUFFER_SIZE
+            if full:
+                self.flush_optimization_logs()
             
-            self.logger.info(f"Optimization logged: {optimization_type} - {device_id} - {description}")
+            self.logger.info("Optimization logged: %s - %s - %s", optimization_type, device_id, description)
             
         except Exception as e:
             self.logger.error(f"Optimization logging error: {e}")
             
+    def flush_optimization_logs(self):
+        """Hand buffered optimization logs to the writer as one transaction"""
+        with self._log_lock:
+            rows, self._log_buffer = self._log_buffer, []
+        if rows:
+            self.queue_write_many('optimization_logs', rows)
+            
     def generate_energy_report(self, days=7):
         """Generate comprehensive energy report"""
         try:
@@ -805,20 +1585,17 @@ class EnergyManagementSystem:
             start_date = end_date - timedelta(days=days)
             
             # Get consumption data
-            self.cursor.execute("""
-                SELECT 
-                    DATE(timestamp) as date,
-                    SUM(power_consumption) as total_consumption,
-                    AVG(power_consumption) as avg_consumption,
-                    MAX(power_consumption) as peak_consumption,
-                    COUNT(*) as reading_count
-                FROM energy_readings 
-                WHERE DATE(timestamp) BETWEEN ? AND ?
-                GROUP BY DATE(timestamp)
-                ORDER BY date
-            """, (start_date, end_date))
-            
-            consumption_data = self.cursor.fetchall()
+            # Half-open timestamp range so idx_readings_ts can serve the scan
+            cursor = self.get_read_connection().execute(
+                DAILY_REPORT_QUERY, (start_date.isoformat(), (end_date + timedelta(days=1)).isoformat())
+            )
+            
+            # Convert rows to structured-array chunks as they are fetched
+            cursor.arraysize = REPORT_FETCH_SIZE
+            chunks = [
+                np.array(rows, dtype=REPORT_ROW_DTYPE)
+                for rows in iter(cursor.fetchmany, [])
+            ]
             
             # Calculate costs and efficiency
             report = {
@@ -833,28 +1610,33 @@ class EnergyManagementSystem:
                 'daily_breakdown': []
             }
             
-            for date, total, avg, peak, count in consumption_data:
-                daily_kwh = total / 1000  # Convert W to kWh
-                daily_cost = self.calculate_daily_cost(date, total)
-                
-                report['daily_breakdown'].append({
-                    'date': date,
-                    'consumption_kwh': daily_kwh,
-                    'cost': daily_cost,
-                    'peak_power': peak,
-                    'efficiency_score': self.calculate_efficiency_score(total, avg)
-                })
-                
-                report['total_consumption_kwh'] += daily_kwh
-                report['total_cost'] += daily_cost
-                report['peak_consumption'] = max(report['peak_consumption'], peak)
-                
-            # Calculate averages
-            if len(consumption_data) > 0:
-                report['average_daily_consumption'] = report['total_consumption_kwh'] / len(consumption_data)
-                report['efficiency_score'] = sum(
-                    day['efficiency_score'] for day in report['daily_breakdown']
-                ) / len(report['daily_breakdown'])
+            if chunks:
+                days_arr = np.concatenate(chunks)
+                daily_kwh = days_arr['total'] / 1000  # Convert W to kWh
+                daily_cost = self.calculate_daily_cost(days_arr['date'], days_arr['total'])
+                daily_efficiency = self.calculate_efficiency_score(days_arr['total'], days_arr['avg'])
+                
+                report['daily_breakdown'] = [
+                    {
+                        'date': date,
+                        'consumption_kwh': kwh,
+                        'cost': cost,
+                        'peak_power': peak,
+                        'efficiency_score': efficiency
+                    }
+                    for date, kwh, cost, peak, efficiency in zip(
+                        days_arr['date'].tolist(), daily_kwh.tolist(), daily_cost.tolist(),
+                        days_arr['peak'].tolist(), daily_efficiency.tolist()
+                    )
+                ]
+                
+                report['total_consumption_kwh'] = float(daily_kwh.sum())
+                report['total_cost'] = float(daily_cost.sum())
+                report['peak_consumption'] = float(days_arr['peak'].max())
+                
+                # Calculate averages
+                report['average_daily_consumption'] = report['total_consumption_kwh'] / len(days_arr)
+                report['efficiency_score'] = float(daily_efficiency.mean())
                 
             # Calculate carbon footprint (assuming 0.82 kg CO2 per kWh)
             report['carbon_footprint'] = report['total_consumption_kwh'] * 0.82
@@ -867,64 +1649,74 @@ class EnergyManagementSystem:
             
     def calculate_daily_cost(self, date, total_consumption_w):
         """Calculate daily electricity cost"""
-        try:
-            # This is a simplified calculation
-            # In reality, you'd need to account for time-of-use rates
-            daily_kwh = total_consumption_w / 1000
-            average_rate = self.config['tariff']['normal_rate']
-            return daily_kwh * average_rate / 100  # Convert paise to rupees
-            
-        except Exception as e:
-            self.logger.error(f"Cost calculation error: {e}")
-            return 0.0
+        # This is a simplified calculation
+        # In reality, you'd need to account for time-of-use rates
+        daily_kwh = total_consumption_w / 1000
+        average_rate = self.config['tariff']['normal_rate']
+        return daily_kwh * average_rate / 100  # Convert paise to rupees
             
     def calculate_efficiency_score(self, total_consumption, avg_consumption):
         """Calculate efficiency score (0-100)"""
-        try:
-            # This is a simplified efficiency calculation
-            # Based on how close actual consumption is to optimal
-            target_consumption = 20000  # 20kW daily target
-            efficiency = max(0, 100 - abs(total_consumption - target_consumption) / target_consumption * 100)
-            return min(100, efficiency)
-            
-        except Exception as e:
-            self.logger.error(f"Efficiency calculation error: {e}")
-            return 50.0
+        # This is a simplified efficiency calculation
+        # Based on how close actual consumption is to optimal
+        # Works on scalars or whole columns of daily totals
+        target_consumption = 20000.0  # 20kW daily target
+        return np.clip(
+            100.0 - np.abs(total_consumption - target_consumption) / target_consumption * 100.0, 0.0, 100.0
+        )
             
     # Utility methods
-    def is_peak_hour(self):
+    def start_tick(self):
+        """Read the clock once for the optimization pass on this thread"""
+        self._tick.now = datetime.now()
+        
+    def end_tick(self):
+        """Go back to reading the clock on every call"""
+        self._tick.now = None
+        
+    def current_time(self):
+        """Current optimization tick, or the wall clock outside of a pass"""
+        return getattr(self._tick, 'now', None) or datetime.now()
+        
+    def is_peak_hour(self, now=None):
         """Check if current time is peak hour"""
-        current_time = datetime.now().time()
-        for peak_period in self.config['tariff']['peak_hours']:
-            start = datetime.strptime(peak_period['start'], '%H:%M').time()
-            end = datetime.strptime(peak_period['end'], '%H:%M').time()
-            if start <= current_time <= end:
-                return True
-        return False
-        
-    def is_off_peak_hour(self):
+        now = now or self.current_time()
+        hour = now.hour
+        if (self._peak_full_bits >> hour) & 1:
+            return True
+        if not (self._peak_partial_bits >> hour) & 1:
+            return False
+        # Period boundary falls inside this hour
+        return bool(self._peak_mask[hour * 60 + now.minute])
+        
+    def is_off_peak_hour(self, now=None):
         """Check if current time is off-peak hour"""
-        current_time = datetime.now().time()
-        for off_peak_period in self.config['tariff']['off_peak_hours']:
-            start = datetime.strptime(off_peak_period['start'], '%H:%M').time()
-            end = datetime.strptime(off_peak_period['end'], '%H:%M').time()
-            if start <= current_time or current_time <= end:  # Handle midnight crossing
-                return True
-        return False
-        
-    def is_daytime(self):
+        now = now or self.current_time()
+        hour = now.hour
+        if (self._off_peak_full_bits >> hour) & 1:
+            return True
+        if not (self._off_peak_partial_bits >> hour) & 1:
+            return False
+        # Period boundary falls inside this hour
+        return bool(self._off_peak_mask[hour * 60 + now.minute])
+        
+    def is_daytime(self, now=None):
         """Check if it's daytime (6 AM to 6 PM)"""
-        current_hour = datetime.now().hour
+        current_hour = (now or self.current_time()).hour
         return 6 <= current_hour <= 18
         
     def get_devices_in_room(self, room):
         """Get all devices in a specific room"""
-        devices = []
-        for device_type in self.config['devices'].values():
-            for device in device_type:
-                if device.get('room') == room:
-                    devices.append(device)
-        return devices
+        return self._devices_by_room.get(room, [])
+        
+    def get_non_essential_devices(self):
+        """Get devices that may be switched off, least essential first"""
+        return self._non_essential_sorted
+        
+    def is_device_on(self, device_id):
+        """Check if a device is drawing power according to its latest reading"""
+        idx = self._dev_idx.get(device_id)
+        return idx is not None and self._power[idx] > 0
         
     def is_room_occupied(self, room):
         """Check if room is currently occupied"""
@@ -933,27 +1725,27 @@ class EnergyManagementSystem:
         
     def get_hourly_rate(self, hour):
         """Get electricity rate for specific hour"""
-        if self.is_peak_hour():
-            return self.config['tariff']['peak_rate']
-        elif self.is_off_peak_hour():
-            return self.config['tariff']['off_peak_rate']
-        else:
-            return self.config['tariff']['normal_rate']
+        return self._hour_rate_table[hour]
             
     def check_optimization_triggers(self):
         """Check if optimization should be triggered"""
-        total_power = sum(reading.get('power', 0) for reading in self.current_readings.values())
+        total_power = self._total_load
         
-        if total_power > self.config['thresholds']['high_usage_alert']:
-            self.optimize_load_balancing()
-            
-        if self.is_peak_hour():
-            self.optimize_cost_efficiency()
+        self.start_tick()
+        try:
+            if total_power > self.config['thresholds']['high_usage_alert']:
+                self.optimize_load_balancing()
+                
+            if self.is_peak_hour():
+                self.optimize_cost_efficiency()
+        finally:
+            self.end_tick()
             
     def run_optimization_cycle(self):
         """Run complete optimization cycle"""
         try:
             self.logger.info("Starting optimization cycle")
+            self.start_tick()
             
             if self.auto_optimization_enabled:
                 self.optimize_load_balancing()
@@ -964,12 +1756,18 @@ class EnergyManagementSystem:
             
         except Exception as e:
             self.logger.error(f"Optimization cycle error: {e}")
+        finally:
+            self.end_tick()
+            self.flush_optimization_logs()
             
     def run(self):
         """Main energy management system loop"""
         try:
             self.logger.info("Energy Management System started")
             
+            # Treat SIGTERM like Ctrl+C so cleanup flushes queued writes
+            signal.signal(signal.SIGTERM, self.handle_shutdown_signal)
+            
             # Schedule optimization tasks
             schedule.every(5).minutes.do(self.run_optimization_cycle)
             schedule.every().hour.do(self.generate_hourly_summary)
@@ -977,7 +1775,8 @@ class EnergyManagementSystem:
             
             while True:
                 schedule.run_pending()
-                time.sleep(60)  # Check every minute
+                # Sleep until the next job is due instead of polling every minute
+                time.sleep(max(schedule.idle_seconds() or 0, 0))
                 
         except KeyboardInterrupt:
             self.logger.info("Energy Management System shutdown requested")
@@ -986,10 +1785,22 @@ class EnergyManagementSystem:
         finally:
             self.cleanup()
             
+    def handle_shutdown_signal(self, signum, frame):
+        """Signal handler that unwinds the main loop into cleanup"""
+        raise KeyboardInterrupt
+        
     def cleanup(self):
         """Cleanup resources"""
         try:
+            # Let the writer thread commit everything still queued
+            self.flush_optimization_logs()
+            self._write_q.put(None)
+            self._writer_thread.join(timeout=10)
             self.conn.close()
+            
+            # Send any device commands still queued before disconnecting
+            self._pub_q.put(None)
+            self._publisher_thread.join(timeout=5)
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
             self.logger.info("Energy Management System cleanup completed")
@@ -73,6 +73,9 @@ const char* device_id = "SmartHome_ESP32_01";
 #define VOLTAGE_SENSOR_PIN 32
 #define RELAY_MAIN_POWER_PIN 33
 
+// MQTT packet buffer; PubSubClient's 256-byte default drops batched command arrays
+#define MQTT_BUFFER_SIZE 1024
+
 // Objects and Variables
 DHT dht(DHT_PIN, DHT_TYPE);
 WiFiClient espClient;
@@ -295,6 +298,7 @@ void setup_wifi() {
 void setup_mqtt() {
     mqttClient.setServer(mqtt_server, 1883);
     mqttClient.setCallback(mqtt_callback);
+    mqttClient.setBufferSize(MQTT_BUFFER_SIZE);
 }
 
 void setup_ota() {
@@ -430,7 +434,16 @@ void mqtt_callback(char* topic, byte* payload, unsigned int length) {
     DynamicJsonDocument doc(1024);
     deserializeJson(doc, message);
     
-    if (doc.containsKey("command")) {
+    // Voice control batches commands sent together into one array
+    if (doc.is<JsonArray>()) {
+        for (JsonObject item : doc.as<JsonArray>()) {
+            if (item.containsKey("command")) {
+                String command = item["command"];
+                String value = item.containsKey("value") ? item["value"] : "";
+                execute_command(command, value);
+            }
+        }
+    } else if (doc.containsKey("command")) {
         String command = doc["command"];
         String value = doc.containsKey("value") ? doc["value"] : "";
         execute_command(command, value);
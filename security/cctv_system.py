@@ -31,6 +31,7 @@ import base64
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import face_recognition
+import dlib
 import smtplib
 from email.mime.text import MimeText
 from email.mime.multipart import MimeMultipart
@@ -39,8 +40,37 @@ import paho.mqtt.client as mqtt
 from flask import Flask, Response, jsonify, render_template_string
 from flask_socketio import SocketIO, emit
 import requests
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
 import pickle
+import functools
+import shutil
+import subprocess
+
+# Optional FAISS nearest-neighbour search for large face galleries
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Optional fast JSON encoding for MQTT payloads
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# paho-mqtt publishes either the bytes from orjson or the str from json
+json_dumps = orjson.dumps if ORJSON_AVAILABLE else json.dumps
+
+# Pipe sizing for the FFmpeg encoder, Linux/Unix only
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
 
 # Configure logging
 logging.basicConfig(
@@ -53,10 +83,308 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# FFmpeg capture options for IP cameras, with and without NVDEC decoding
+HW_DECODE_CAPTURE_OPTIONS = 'rtsp_transport;tcp|hwaccel;cuda|video_codec;h264_cuvid'
+SW_DECODE_CAPTURE_OPTIONS = 'rtsp_transport;tcp'
+
+# Local hour at which old recordings are cleaned up
+CLEANUP_HOUR = 2
+CLEANUP_WORKERS = 16
+CLEANUP_VACUUM_PAGES = 1000
+
+# Frames buffered per camera between capture and the analysis threads
+FRAME_RING_SLOTS = 4
+
+# Batched event and recording inserts
+INSERT_EVENT_SQL = '''
+    INSERT INTO events 
+    (camera_id, event_type, description, image_path, video_path, confidence)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+INSERT_RECORDING_SQL = '''
+    INSERT INTO recordings 
+    (camera_id, file_path, duration, file_size)
+    VALUES (?, ?, ?, ?)
+'''
+EVENT_BATCH_SIZE = 100
+EVENT_FLUSH_INTERVAL = 0.1  # seconds
+
+def prepare_face_frame(frame, scale, buffers=None):
+    """Downscale a BGR frame by scale and convert it to RGB, reusing buffers['rgb_buf'] when given"""
+    if scale != 1.0:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    if buffers is None:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    
+    # Convert into the same buffer every frame instead of allocating a new one
+    rgb_buf = buffers.get('rgb_buf')
+    if rgb_buf is None or rgb_buf.shape != frame.shape:
+        rgb_buf = buffers['rgb_buf'] = np.empty_like(frame)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_buf)
+
+def build_face_index(known_matrix):
+    """FAISS L2 index over the known encodings, or None without FAISS"""
+    if not FAISS_AVAILABLE or not len(known_matrix):
+        return None
+    face_index = faiss.IndexFlatL2(known_matrix.shape[1])
+    face_index.add(np.ascontiguousarray(known_matrix, dtype=np.float32))
+    return face_index
+
+class FaceGallery:
+    """Known face encodings with nearest-neighbour lookup"""
+    
+    def __init__(self, known_matrix, known_labels):
+        self.matrix = known_matrix
+        self.labels = known_labels
+        # Squared norms for |a - b|^2 = |a|^2 + |b|^2 - 2 a.b
+        self.sq_norms = np.einsum('ij,ij->i', known_matrix, known_matrix)
+        self.index = build_face_index(known_matrix)
+    
+    def __len__(self):
+        return len(self.labels)
+    
+    def nearest(self, face_encodings):
+        """Index of and distance to the closest known encoding for each query encoding"""
+        queries = np.asarray(face_encodings, dtype=np.float64)
+        
+        if self.index is not None:
+            # One SIMD nearest-neighbour search for every face in the frame
+            squared, nearest = self.index.search(queries.astype(np.float32), 1)
+            return nearest[:, 0], np.sqrt(np.maximum(squared[:, 0], 0))
+        
+        # Squared distances to every known encoding from a single BLAS matrix product
+        squared = (
+            self.sq_norms[np.newaxis, :]
+            - 2.0 * (queries @ self.matrix.T)
+            + np.einsum('ij,ij->i', queries, queries)[:, np.newaxis]
+        )
+        best = squared.argmin(axis=1)
+        return best, np.sqrt(np.maximum(squared[np.arange(len(best)), best], 0))
+
+def match_face_locations(rgb_frame, face_locations, gallery, tolerance, scale):
+    """Encode located faces and match them against the known encodings"""
+    if not face_locations:
+        return []
+    
+    # Nothing to match against, so skip the expensive encoding step
+    if not len(gallery):
+        return [
+            {
+                'name': 'Unknown',
+                'confidence': 0.0,
+                'location': (
+                    int(top / scale), int(right / scale),
+                    int(bottom / scale), int(left / scale)
+                )
+            }
+            for top, right, bottom, left in face_locations
+        ]
+    
+    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    best_matches, best_distances = gallery.nearest(face_encodings)
+    
+    detected_faces = []
+    
+    for (top, right, bottom, left), best, distance in zip(
+            face_locations, best_matches.tolist(), best_distances.tolist()):
+        # Try to match with known faces
+        name = "Unknown"
+        confidence = 0.0
+        
+        if distance <= tolerance:
+            confidence = 1 - distance
+            name = gallery.labels[best]
+        
+        # Map boxes from the downscaled detection frame back to full resolution
+        detected_faces.append({
+            'name': name,
+            'confidence': confidence,
+            'location': (
+                int(top / scale), int(right / scale),
+                int(bottom / scale), int(left / scale)
+            )
+        })
+    
+    return detected_faces
+
+def recognize_faces(frame, gallery, face_config, buffers=None):
+    """Detect faces in a BGR frame and match them against the known encodings"""
+    scale = face_config.get('detection_scale', 1.0)
+    rgb_frame = prepare_face_frame(frame, scale, buffers)
+    
+    # Find face locations
+    face_locations = face_recognition.face_locations(
+        rgb_frame, model=face_config.get('model', 'hog')
+    )
+    
+    return match_face_locations(
+        rgb_frame, face_locations, gallery, face_config['tolerance'], scale
+    )
+
+# State of a face recognition worker process, set once by init_face_worker
+_worker_state = {}
+
+def init_face_worker(known_shm_name, known_shape, known_labels, face_config):
+    """Attach a worker process to the shared known-encodings matrix"""
+    known_shm = shared_memory.SharedMemory(name=known_shm_name)
+    _worker_state['known_shm'] = known_shm
+    _worker_state['gallery'] = FaceGallery(
+        np.ndarray(known_shape, np.float64, buffer=known_shm.buf), known_labels
+    )
+    _worker_state['face_config'] = face_config
+
+def detect_faces_worker(shm_name, shape):
+    """Recognize faces in a frame published through shared memory"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frame = np.ndarray(shape, np.uint8, buffer=shm.buf)
+        faces = recognize_faces(
+            frame, _worker_state['gallery'], _worker_state['face_config'], _worker_state
+        )
+        del frame
+        return faces
+    finally:
+        shm.close()
+
+# Encoder arguments for recordings piped through FFmpeg, including each encoder's input pixel format
+FFMPEG_ENCODER_ARGS = {
+    # NVIDIA
+    'h264_nvenc': ['-c:v', 'h264_nvenc', '-preset', 'p4', '-pix_fmt', 'yuv420p'],
+    'hevc_nvenc': ['-c:v', 'hevc_nvenc', '-preset', 'p4', '-pix_fmt', 'yuv420p', '-tag:v', 'hvc1'],
+    # Intel / AMD through VA-API, and Intel Quick Sync
+    'h264_vaapi': [
+        '-vaapi_device', '/dev/dri/renderD128', '-vf', 'format=nv12,hwupload', '-c:v', 'h264_vaapi'
+    ],
+    'h264_qsv': ['-c:v', 'h264_qsv', '-preset', 'veryfast', '-pix_fmt', 'nv12'],
+    # Raspberry Pi and other V4L2 memory-to-memory encoders
+    'h264_v4l2m2m': ['-c:v', 'h264_v4l2m2m', '-pix_fmt', 'yuv420p'],
+    'libx264': ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p']
+}
+
+@functools.lru_cache(maxsize=None)
+def select_ffmpeg_encoder(preferred):
+    """Pick the preferred FFmpeg encoder if this build has it, else libx264; None without FFmpeg"""
+    if shutil.which('ffmpeg') is None:
+        return None
+    
+    try:
+        available = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    
+    if preferred in FFMPEG_ENCODER_ARGS and f" {preferred} " in available:
+        return preferred
+    return 'libx264'
+
+# Encoder pipe capacity; the default 64 KB splits a 1080p frame into ~100 writes
+FFMPEG_PIPE_SIZE = 1 << 20
+F_SETPIPE_SZ = 1031  # fcntl.F_SETPIPE_SZ on Linux, missing before Python 3.10
+
+class FrameDifferenceSubtractor:
+    """BackgroundSubtractor-style motion mask from the difference to an earlier frame"""
+    
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.previous = None
+    
+    def apply(self, gray, learningRate=-1):
+        """Foreground mask of pixels that changed by more than threshold"""
+        previous = self.previous
+        # learningRate 0 keeps the reference frame, matching MOG2's frozen background
+        if previous is None or learningRate != 0:
+            self.previous = gray
+        if previous is None:
+            return cv2.absdiff(gray, gray)
+        
+        # absdiff and threshold are single SIMD passes over the small gray frame
+        _, fg_mask = cv2.threshold(cv2.absdiff(previous, gray), self.threshold, 255, cv2.THRESH_BINARY)
+        return fg_mask
+
+class FFmpegWriter:
+    """cv2.VideoWriter-style writer that pipes raw frames into FFmpeg"""
+    
+    def __init__(self, video_path, fps, frame_size, encoder):
+        width, height = frame_size
+        self.frame_shape = (height, width, 3)
+        
+        # Planar YUV 4:2:0 (even sizes only) is converted by OpenCV's SIMD path and pipes half the bytes of BGR
+        if width % 2 == 0 and height % 2 == 0:
+            self.yuv_buf = np.empty((height * 3 // 2, width), np.uint8)
+            pix_fmt = 'yuv420p'
+        else:
+            self.yuv_buf = None
+            pix_fmt = 'bgr24'
+        
+        self.process = subprocess.Popen(
+            [
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', pix_fmt,
+                '-s', f'{width}x{height}', '-r', str(fps),
+                '-i', '-'
+            ] + FFMPEG_ENCODER_ARGS[encoder] + [str(video_path)],
+            stdin=subprocess.PIPE
+        )
+        
+        # Larger pipe so each frame goes through in fewer writes and encoder wakeups
+        if FCNTL_AVAILABLE:
+            try:
+                fcntl.fcntl(self.process.stdin.fileno(), getattr(fcntl, 'F_SETPIPE_SZ', F_SETPIPE_SZ), FFMPEG_PIPE_SIZE)
+            except OSError:
+                pass
+    
+    def write(self, frame):
+        """Send one frame to the encoder, dropping frames of the wrong size"""
+        if frame.shape != self.frame_shape:
+            return
+        if self.yuv_buf is not None:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420, dst=self.yuv_buf)
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            logger.error("FFmpeg encoder exited, frame dropped")
+    
+    def release(self):
+        """Finish the file and wait for the encoder to exit"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+
 class CCTVSystem:
     def __init__(self, config_file='config/cctv_config.json'):
         """Initialize CCTV surveillance system"""
         self.config = self.load_config(config_file)
+        
+        # Motion detection works on a downscaled frame, so its area threshold shrinks too
+        motion_config = self.config['motion_detection']
+        self.motion_scale = 1.0 / motion_config.get('downscale', 1)
+        self.motion_min_area = motion_config['min_area'] * self.motion_scale ** 2
+        self.motion_enabled = motion_config.get('enabled', True)
+        self.bg_update_every = motion_config.get('bg_update_every', 1)
+        
+        # Face recognition settings read on every frame
+        face_config = self.config.get('face_recognition', {})
+        self.face_enabled = face_config.get('enabled', True)
+        self.face_tolerance = face_config.get('tolerance', 0.6)
+        self.face_scale = face_config.get('detection_scale', 1.0)
+        self.face_every_n_frames = face_config.get('every_n_frames', 1)
+        self.face_require_motion = face_config.get('require_motion', True) and self.motion_enabled
+        
+        # Frames are only decoded while analysis, a recording or a viewer needs them
+        self.analysis_enabled = self.motion_enabled or self.face_enabled
+        
+        # OpenCL offload of the motion pipeline, used only if a device is present
+        self.use_opencl = motion_config.get('opencl', True) and cv2.ocl.haveOpenCL()
+        cv2.ocl.setUseOpenCL(self.use_opencl)
+        
+        # Opening kernel for motion mask noise reduction
+        self.morph_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        
         self.cameras = {}
         self.recording_threads = {}
         self.motion_detectors = {}
@@ -64,6 +392,10 @@ class CCTVSystem:
         self.known_faces = {}
         self.alert_queue = queue.Queue()
         self.running = False
+        self.status_data = {'status': None, 'timestamp': None, 'cameras': {}}
+        self.status_dirty = True
+        self.stop_event = threading.Event()
+        self.cleanup_timer = None
         
         # Initialize database
         self.init_database()
@@ -80,6 +412,13 @@ class CCTVSystem:
         # Load known faces
         self.load_known_faces()
         
+        # Recognize faces in worker processes so cameras don't contend for the GIL
+        self.face_pool = None
+        self.known_shm = None
+        if (self.face_enabled and face_config.get('process_pool', True)
+                and face_config.get('model', 'hog') != 'cnn'):
+            self.start_face_pool()
+        
         # Initialize background subtractor for motion detection
         self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
             detectShadows=True
@@ -88,6 +427,13 @@ class CCTVSystem:
         # Thread pool for processing
         self.executor = ThreadPoolExecutor(max_workers=10)
         
+        # CNN face detection runs batched across cameras instead of per frame
+        self.face_batching = (
+            self.face_enabled and face_config.get('model', 'hog') == 'cnn'
+        )
+        if self.face_batching and not getattr(dlib, 'DLIB_USE_CUDA', False):
+            logger.warning("CNN face model selected but dlib was built without CUDA")
+        
     def load_config(self, config_file):
         """Load configuration from JSON file"""
         try:
@@ -117,13 +463,18 @@ class CCTVSystem:
                     "type": "ip",
                     "resolution": [1920, 1080],
                     "fps": 25,
+                    "hw_decode": True,
                     "location": "living_room"
                 }
             ],
             "motion_detection": {
+                "method": "mog2",  # or "frame_diff": threshold frame differences at sensitivity
                 "sensitivity": 30,
                 "min_area": 500,
-                "blur_size": 21
+                "blur_size": 21,
+                "downscale": 4,  # motion runs on a grayscale frame 1/4 the width and height
+                "bg_update_every": 5,  # frames between background model updates
+                "opencl": True  # run motion detection through OpenCL UMat when available
             },
             "recording": {
                 "enabled": True,
@@ -131,7 +482,8 @@ class CCTVSystem:
                 "quality": "high",
                 "duration": 300,  # 5 minutes per file
                 "storage_path": "recordings/",
-                "retention_days": 30
+                "retention_days": 30,
+                "encoder": "h264_nvenc"  # falls back to libx264 if FFmpeg lacks NVENC
             },
             "alerts": {
                 "email": {
@@ -150,12 +502,18 @@ class CCTVSystem:
             "face_recognition": {
                 "enabled": True,
                 "tolerance": 0.6,
-                "model": "hog"  # or "cnn" for GPU
+                "model": "hog",  # or "cnn" for GPU
+                "batch_interval": 0.2,  # seconds between cross-camera CNN batches
+                "detection_scale": 0.25,  # frames are downscaled by this before detection
+                "process_pool": True,  # recognize faces in worker processes (HOG model)
+                "every_n_frames": 5,  # run face recognition at most once per N frames
+                "require_motion": True  # only look for faces shortly after motion
             },
             "streaming": {
                 "enabled": True,
                 "port": 5000,
-                "quality": "medium"
+                "quality": "medium",
+                "jpeg_quality": 75
             },
             "mqtt": {
                 "broker": "localhost",
@@ -178,6 +536,13 @@ class CCTVSystem:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # Let retention cleanup hand free pages back in bounded steps (applies to new databases)
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        
+        # WAL lets the event writer commit without blocking readers
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        
         # Events table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS events (
@@ -206,8 +571,61 @@ class CCTVSystem:
             )
         ''')
         
+        # Retention cleanup selects recordings by age
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_recordings_ts
+            ON recordings(timestamp)
+        ''')
+        
         conn.commit()
         conn.close()
+        
+        # Events and recordings are inserted in batches by a single writer thread
+        self.db_writer_queue = queue.Queue()
+        self.db_writer_thread = threading.Thread(
+            target=self.db_writer,
+            daemon=True
+        )
+        self.db_writer_thread.start()
+    
+    def db_writer(self):
+        """Insert queued rows, committing every 100 rows or 100 ms"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        
+        running = True
+        while running:
+            row = self.db_writer_queue.get()
+            if row is None:
+                break
+            
+            batch = [row]
+            deadline = time.time() + EVENT_FLUSH_INTERVAL
+            while len(batch) < EVENT_BATCH_SIZE:
+                try:
+                    row = self.db_writer_queue.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    running = False
+                    break
+                batch.append(row)
+            
+            # One executemany per statement, all in a single transaction
+            rows_by_sql = {}
+            for sql, row in batch:
+                rows_by_sql.setdefault(sql, []).append(row)
+            
+            try:
+                for sql, rows in rows_by_sql.items():
+                    conn.executemany(sql, rows)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error writing to database: {e}")
+        
+        conn.close()
     
     def setup_mqtt(self):
         """Setup MQTT client for communication"""
@@ -336,6 +754,10 @@ class CCTVSystem:
     def load_known_faces(self):
         """Load known faces for recognition"""
         faces_dir = Path('data/known_faces')
+        self.known_matrix = np.empty((0, 128))
+        self.known_labels = np.array([], dtype=object)
+        self.face_gallery = FaceGallery(self.known_matrix, self.known_labels)
+        
         if not faces_dir.exists():
             faces_dir.mkdir(parents=True)
             logger.info("Created known_faces directory")
@@ -358,6 +780,16 @@ class CCTVSystem:
                 if encodings:
                     self.known_faces[person_name] = encodings
                     logger.info(f"Loaded {len(encodings)} faces for {person_name}")
+        
+        # Flatten all encodings into one (N, 128) matrix with a parallel label array
+        if self.known_faces:
+            self.known_matrix = np.vstack([
+                encoding for encodings in self.known_faces.values() for encoding in encodings
+            ])
+            self.known_labels = np.array([
+                name for name, encodings in self.known_faces.items() for _ in encodings
+            ], dtype=object)
+            self.face_gallery = FaceGallery(self.known_matrix, self.known_labels)
     
     def initialize_cameras(self):
         """Initialize all cameras"""
@@ -373,29 +805,71 @@ class CCTVSystem:
         
         # Initialize video capture
         if cam_config['type'] == 'ip':
-            cap = cv2.VideoCapture(cam_config['source'])
+            cap = self.open_stream_capture(cam_config)
         else:
             cap = cv2.VideoCapture(int(cam_config['source']))
         
         if not cap.isOpened():
             raise Exception(f"Cannot open camera {cam_id}")
         
+        # Keep only the newest frame queued, bounding latency and memory per camera
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        # USB cameras deliver compressed MJPG, so only retrieved frames get decoded
+        if cam_config['type'] != 'ip':
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        
         # Set camera properties
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, cam_config['resolution'][0])
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cam_config['resolution'][1])
         cap.set(cv2.CAP_PROP_FPS, cam_config['fps'])
         
+        # Frames are decoded in turn into a ring of preallocated buffers
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or cam_config['resolution'][0]
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or cam_config['resolution'][1]
+        
         self.cameras[cam_id] = {
             'capture': cap,
             'config': cam_config,
             'active': True,
             'recording': False,
             'last_frame': None,
-            'motion_detector': cv2.createBackgroundSubtractorMOG2()
+            'frame_ring': [
+                np.empty((height, width, 3), np.uint8)
+                for _ in range(cam_config.get('ring_slots', FRAME_RING_SLOTS))
+            ],
+            'frame_seq': 0,
+            'frame_ready': threading.Condition(),
+            'rgb_buf': None,
+            'viewers': 0,
+            'motion_detector': self.create_motion_detector()
         }
         
+        self.status_dirty = True
+        
         logger.info(f"Camera {cam_id} ({cam_config['name']}) initialized")
     
+    def create_motion_detector(self):
+        """Per-camera motion model: MOG2, or cheaper frame differencing"""
+        motion_config = self.config['motion_detection']
+        if motion_config.get('method', 'mog2') == 'frame_diff':
+            return FrameDifferenceSubtractor(motion_config.get('sensitivity', 30))
+        return cv2.createBackgroundSubtractorMOG2()
+    
+    def open_stream_capture(self, cam_config):
+        """Open an IP camera through FFmpeg, preferring NVDEC hardware decoding"""
+        if cam_config.get('hw_decode', True):
+            # Read by OpenCV's FFmpeg backend when the capture is opened
+            os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = HW_DECODE_CAPTURE_OPTIONS
+            cap = cv2.VideoCapture(cam_config['source'], cv2.CAP_FFMPEG)
+            if cap.isOpened():
+                return cap
+            cap.release()
+            logger.warning(f"Hardware decoding unavailable for camera {cam_config['id']}, using software decoding")
+        
+        os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = SW_DECODE_CAPTURE_OPTIONS
+        return cv2.VideoCapture(cam_config['source'], cv2.CAP_FFMPEG)
+    
     def start_surveillance(self):
         """Start the surveillance system"""
         if self.running:
@@ -407,7 +881,13 @@ class CCTVSystem:
         # Initialize cameras
         self.initialize_cameras()
         
-        # Start camera threads
+        # Per camera: one capture thread plus one thread per analysis task
+        tasks = []
+        if self.motion_enabled:
+            tasks.append(self.process_motion)
+        if self.face_enabled and not self.face_batching:
+            tasks.append(self.process_faces)
+        
         for cam_id in self.cameras.keys():
             thread = threading.Thread(
                 target=self.camera_worker,
@@ -415,6 +895,22 @@ class CCTVSystem:
                 daemon=True
             )
             thread.start()
+            
+            for task in tasks:
+                task_thread = threading.Thread(
+                    target=self.frame_task_worker,
+                    args=(cam_id, task),
+                    daemon=True
+                )
+                task_thread.start()
+        
+        # Start batched face detection thread
+        if self.face_batching:
+            face_thread = threading.Thread(
+                target=self.face_batch_worker,
+                daemon=True
+            )
+            face_thread.start()
         
         # Start alert processing thread
         alert_thread = threading.Thread(
@@ -433,113 +929,239 @@ class CCTVSystem:
         
         # Publish system status
         self.publish_system_status("online")
+        
+        # Cleanup old recordings daily
+        self.schedule_cleanup()
     
     def camera_worker(self, cam_id):
         """Worker thread for individual camera"""
         camera = self.cameras[cam_id]
         cap = camera['capture']
-        motion_detector = camera['motion_detector']
+        ring = camera['frame_ring']
+        frame_ready = camera['frame_ready']
         
         while self.running and camera['active']:
             try:
-                ret, frame = cap.read()
+                # grab() blocks on the camera's own clock, so no sleep pacing is needed
+                ret = cap.grab()
                 if not ret:
                     logger.warning(f"Failed to read from camera {cam_id}")
-                    time.sleep(1)
+                    self.stop_event.wait(1)
                     continue
                 
-                # Store current frame
-                camera['last_frame'] = frame.copy()
+                # Nothing consumes this frame, so skip its decode
+                if not (self.analysis_enabled or camera['recording'] or camera['viewers']):
+                    continue
                 
-                # Process frame
-                self.process_frame(cam_id, frame, motion_detector)
+                # Decode straight into the next ring slot
+                frame_seq = camera['frame_seq'] + 1
+                slot = frame_seq % len(ring)
+                ret, frame = cap.retrieve(ring[slot])
+                if not ret:
+                    logger.warning(f"Failed to decode frame from camera {cam_id}")
+                    continue
                 
-                time.sleep(1 / camera['config']['fps'])
+                # retrieve() reallocates if the stream size differs from the buffer
+                ring[slot] = frame
+                
+                # Publish current frame without copying it
+                camera['last_frame'] = frame
+                with frame_ready:
+                    camera['frame_seq'] = frame_seq
+                    frame_ready.notify_all()
                 
             except Exception as e:
                 logger.error(f"Error in camera worker {cam_id}: {e}")
-                time.sleep(5)
+                self.stop_event.wait(5)
         
         cap.release()
     
-    def process_frame(self, cam_id, frame, motion_detector):
-        """Process individual frame for motion and face detection"""
+    def frame_task_worker(self, cam_id, task):
+        """Run one analysis task on the newest frame of a camera's ring"""
+        camera = self.cameras[cam_id]
+        ring = camera['frame_ring']
+        frame_ready = camera['frame_ready']
+        last_seq = 0
+        
+        while self.running and camera['active']:
+            with frame_ready:
+                if camera['frame_seq'] == last_seq:
+                    frame_ready.wait(timeout=1)
+                frame_seq = camera['frame_seq']
+            
+            if frame_seq == last_seq:
+                continue
+            
+            # Skip ahead to the latest frame if this task fell behind
+            last_seq = frame_seq
+            task(cam_id, ring[frame_seq % len(ring)], frame_seq)
+    
+    def process_motion(self, cam_id, frame, frame_seq):
+        """Run motion detection on one frame"""
+        try:
+            camera = self.cameras[cam_id]
+            update_background = frame_seq % self.bg_update_every == 0
+            motion_detected = self.detect_motion(frame, camera['motion_detector'], update_background)
+            if motion_detected:
+                camera['motion_seq'] = frame_seq
+                self.handle_motion_detected(cam_id, frame)
+            
+        except Exception as e:
+            logger.error(f"Error detecting motion for camera {cam_id}: {e}")
+    
+    def face_check_due(self, camera, frame_seq):
+        """Whether a frame should get face recognition: recent motion and not checked in the last K frames"""
+        every_n_frames = self.face_every_n_frames
+        if frame_seq - camera.get('face_seq', -every_n_frames) < every_n_frames:
+            return False
+        
+        # Idle scenes skip the expensive detector entirely
+        if (self.face_require_motion
+                and frame_seq - camera.get('motion_seq', -every_n_frames - 1) > every_n_frames):
+            return False
+        
+        camera['face_seq'] = frame_seq
+        return True
+    
+    def process_faces(self, cam_id, frame, frame_seq):
+        """Run face recognition on one frame"""
         try:
-            # Motion detection
-            if self.config.get('motion_detection', {}).get('enabled', True):
-                motion_detected = self.detect_motion(frame, motion_detector)
-                if motion_detected:
-                    self.handle_motion_detected(cam_id, frame)
+            if not self.face_check_due(self.cameras[cam_id], frame_seq):
+                return
             
-            # Face recognition
-            if self.config.get('face_recognition', {}).get('enabled', True):
-                faces = self.detect_faces(frame)
+            # Own copy, since capture may reuse the ring slot while detection runs
+            if self.face_pool is not None:
+                frame, faces = self.detect_faces_in_pool(cam_id, frame)
+                # Face events are saved in the background while the next frame reuses the shared memory
                 if faces:
-                    self.handle_faces_detected(cam_id, frame, faces)
+                    frame = frame.copy()
+            else:
+                frame = frame.copy()
+                faces = self.detect_faces(frame, self.cameras[cam_id])
+            if faces:
+                self.handle_faces_detected(cam_id, frame, faces)
             
         except Exception as e:
-            logger.error(f"Error processing frame for camera {cam_id}: {e}")
+            logger.error(f"Error recognizing faces for camera {cam_id}: {e}")
     
-    def detect_motion(self, frame, motion_detector):
+    def detect_motion(self, frame, motion_detector, update_background=True):
         """Detect motion in frame"""
-        # Apply background subtraction
-        fg_mask = motion_detector.apply(frame)
+        # Let OpenCV's T-API run the pipeline below on the GPU when available
+        if self.use_opencl:
+            frame = cv2.UMat(frame)
+        
+        # Small grayscale copy keeps the background model cache-sized
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.motion_scale != 1.0:
+            gray = cv2.resize(
+                gray, None, fx=self.motion_scale, fy=self.motion_scale,
+                interpolation=cv2.INTER_AREA
+            )
+        
+        # Apply background subtraction, only learning on every Kth frame
+        fg_mask = motion_detector.apply(gray, learningRate=-1 if update_background else 0)
         
         # Noise reduction
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, kernel)
+        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, self.morph_kernel)
+        if self.use_opencl:
+            fg_mask = fg_mask.get()
         
-        # Find contours
-        contours, _ = cv2.findContours(
-            fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
+        # Label foreground blobs; stats row 0 is the background
+        _, _, stats, _ = cv2.connectedComponentsWithStats(fg_mask, connectivity=8)
         
         # Check for significant motion
-        min_area = self.config['motion_detection']['min_area']
-        for contour in contours:
-            if cv2.contourArea(contour) > min_area:
-                return True
-        
-        return False
+        return bool((stats[1:, cv2.CC_STAT_AREA] > self.motion_min_area).any())
     
-    def detect_faces(self, frame):
+    def detect_faces(self, frame, buffers=None):
         """Detect and recognize faces in frame"""
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Find face locations and encodings
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-        
-        detected_faces = []
+        return recognize_faces(
+            frame, self.face_gallery, self.config['face_recognition'], buffers
+        )
+    
+    def prepare_face_frame(self, frame, buffers=None):
+        """Downscale a BGR frame by detection_scale and convert it to RGB"""
+        return prepare_face_frame(frame, self.face_scale, buffers)
+    
+    def match_faces(self, rgb_frame, face_locations):
+        """Encode located faces and match them against known faces"""
+        return match_face_locations(
+            rgb_frame, face_locations, self.face_gallery,
+            self.face_tolerance, self.face_scale
+        )
+    
+    def start_face_pool(self):
+        """Start face recognition worker processes sharing the known encodings"""
+        # Known encodings are shared once; frames go through per-camera shared memory
+        self.known_shm = shared_memory.SharedMemory(create=True, size=max(self.known_matrix.nbytes, 1))
+        np.ndarray(self.known_matrix.shape, self.known_matrix.dtype, buffer=self.known_shm.buf)[:] = self.known_matrix
+        
+        self.face_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_face_worker,
+            initargs=(
+                self.known_shm.name, self.known_matrix.shape,
+                list(self.known_labels), self.config['face_recognition']
+            )
+        )
+    
+    def detect_faces_in_pool(self, cam_id, frame):
+        """Copy a frame into the camera's shared memory and recognize faces in a worker process"""
+        camera = self.cameras[cam_id]
+        shm = camera.get('face_shm')
+        if shm is None or shm.size < frame.nbytes:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = camera['face_shm'] = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        
+        shared_frame = np.ndarray(frame.shape, np.uint8, buffer=shm.buf)
+        np.copyto(shared_frame, frame)
+        
+        faces = self.face_pool.submit(detect_faces_worker, shm.name, frame.shape).result()
+        return shared_frame, faces
+    
+    def face_batch_worker(self):
+        """Run CNN face detection on the latest frame of every camera in one batch"""
+        interval = self.config['face_recognition'].get('batch_interval', 0.2)
         
-        for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-            # Try to match with known faces
-            name = "Unknown"
-            confidence = 0.0
-            
-            for person_name, known_encodings in self.known_faces.items():
-                matches = face_recognition.compare_faces(
-                    known_encodings, face_encoding,
-                    tolerance=self.config['face_recognition']['tolerance']
-                )
+        while self.running:
+            try:
+                started = time.time()
                 
-                if True in matches:
-                    # Calculate confidence
-                    distances = face_recognition.face_distance(
-                        known_encodings, face_encoding
+                # Newest unseen frame per camera, grouped by size since a dlib batch needs one size
+                batches = {}
+                for cam_id, camera in self.cameras.items():
+                    frame = camera['last_frame']
+                    frame_seq = camera['frame_seq']
+                    if (camera['active'] and frame is not None and frame_seq != camera.get('batched_seq')
+                            and self.face_check_due(camera, frame_seq)):
+                        camera['batched_seq'] = frame_seq
+                        # Own copy, since capture reuses the ring slot a few frames later
+                        batches.setdefault(frame.shape, []).append((cam_id, frame.copy()))
+                
+                for entries in batches.values():
+                    rgb_frames = [
+                        self.prepare_face_frame(frame, self.cameras[cam_id])
+                        for cam_id, frame in entries
+                    ]
+                    batch_locations = face_recognition.batch_face_locations(
+                        rgb_frames,
+                        number_of_times_to_upsample=0,
+                        batch_size=len(rgb_frames)
                     )
-                    confidence = 1 - min(distances)
-                    name = person_name
-                    break
-            
-            detected_faces.append({
-                'name': name,
-                'confidence': confidence,
-                'location': (top, right, bottom, left)
-            })
-        
-        return detected_faces
+                    
+                    for (cam_id, frame), rgb_frame, face_locations in zip(entries, rgb_frames, batch_locations):
+                        faces = self.match_faces(rgb_frame, face_locations) if face_locations else []
+                        self.cameras[cam_id]['faces'] = faces
+                        if faces:
+                            self.handle_faces_detected(cam_id, frame, faces)
+                
+                self.stop_event.wait(max(0, interval - (time.time() - started)))
+                
+            except Exception as e:
+                logger.error(f"Error in face batch worker: {e}")
+                self.stop_event.wait(1)
     
     def handle_motion_detected(self, cam_id, frame):
         """Handle motion detection event"""
@@ -567,7 +1189,7 @@ class CCTVSystem:
         # Publish to MQTT
         self.mqtt_client.publish(
             self.config['mqtt']['topics']['motion_detected'],
-            json.dumps(alert)
+            json_dumps(alert)
         )
         
         # Emit to web clients
@@ -580,9 +1202,9 @@ class CCTVSystem:
         timestamp = datetime.datetime.now()
         
         for face in faces:
-            # Save frame with face highlighted
-            frame_with_face = self.draw_face_box(frame.copy(), face)
-            frame_path = self.save_event_frame(cam_id, frame_with_face, 'face')
+            # Frame with face highlighted is drawn and saved off the detection thread
+            frame_path = self.event_frame_path(cam_id, 'face')
+            alert = None
             
             # Log event
             description = f"Face detected: {face['name']} (confidence: {face['confidence']:.2f})"
@@ -601,16 +1223,17 @@ class CCTVSystem:
                     'timestamp': timestamp.isoformat(),
                     'image_path': frame_path
                 }
-                self.alert_queue.put(alert)
                 
                 # Publish to MQTT
                 self.mqtt_client.publish(
                     self.config['mqtt']['topics']['face_detected'],
-                    json.dumps(alert)
+                    json_dumps(alert)
                 )
                 
                 # Emit to web clients
                 self.socketio.emit('face_detected', alert)
+            
+            self.executor.submit(self._save_face_event, frame, face, frame_path, alert)
         
         logger.info(f"Detected {len(faces)} faces on camera {cam_id}")
     
@@ -630,33 +1253,48 @@ class CCTVSystem:
         
         return frame
     
-    def save_event_frame(self, cam_id, frame, event_type):
-        """Save frame for event"""
+    def _save_face_event(self, frame, face, frame_path, alert):
+        """Draw a face box on a copy of frame, save it and queue its alert"""
+        try:
+            frame_with_face = self.draw_face_box(frame.copy(), face)
+            cv2.imwrite(frame_path, frame_with_face)
+            
+            # Alerts go out once their image exists so emails can attach it
+            if alert is not None:
+                self.alert_queue.put(alert)
+            
+        except Exception as e:
+            logger.error(f"Error saving face event frame {frame_path}: {e}")
+    
+    def event_frame_path(self, cam_id, event_type):
+        """Path an event frame is saved under"""
         timestamp = datetime.datetime.now()
         filename = f"{cam_id}_{event_type}_{timestamp.strftime('%Y%m%d_%H%M%S')}.jpg"
         
         events_dir = Path('data/events')
         events_dir.mkdir(exist_ok=True)
         
-        frame_path = events_dir / filename
-        cv2.imwrite(str(frame_path), frame)
+        return str(events_dir / filename)
+    
+    def save_event_frame(self, cam_id, frame, event_type):
+        """Save frame for event"""
+        frame_path = self.event_frame_path(cam_id, event_type)
+        cv2.imwrite(frame_path, frame)
         
-        return str(frame_path)
+        return frame_path
     
     def log_event(self, cam_id, event_type, description, image_path=None, 
                   video_path=None, confidence=None):
         """Log event to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO events 
-            (camera_id, event_type, description, image_path, video_path, confidence)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (cam_id, event_type, description, image_path, video_path, confidence))
-        
-        conn.commit()
-        conn.close()
+        self.db_writer_queue.put(
+            (INSERT_EVENT_SQL, (cam_id, event_type, description, image_path, video_path, confidence))
+        )
+    
+    def log_recording(self, cam_id, video_path, duration, file_size):
+        """Log finished recording to database"""
+        self.db_writer_queue.put(
+            (INSERT_RECORDING_SQL, (cam_id, str(video_path), duration, file_size))
+        )
     
     def process_alerts(self):
         """Process alert queue"""
@@ -745,17 +1383,31 @@ class CCTVSystem:
             return
         
         camera = self.cameras[cam_id]
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, self.config['streaming'].get('jpeg_quality', 75)]
         
-        while self.running and camera['active']:
-            if camera['last_frame'] is not None:
-                # Encode frame as JPEG
-                ret, buffer = cv2.imencode('.jpg', camera['last_frame'])
-                if ret:
-                    frame_bytes = buffer.tobytes()
+        # Keep the capture thread decoding while this viewer is connected
+        with camera['frame_ready']:
+            camera['viewers'] += 1
+        
+        try:
+            while self.running and camera['active']:
+                frame_seq = camera['frame_seq']
+                if camera['last_frame'] is not None and camera.get('jpeg_seq') != frame_seq:
+                    # Encode each frame once; every viewer shares the cached bytes
+                    ret, buffer = cv2.imencode('.jpg', camera['last_frame'], encode_params)
+                    if ret:
+                        camera['jpeg'] = buffer.tobytes()
+                        camera['jpeg_seq'] = frame_seq
+                
+                frame_bytes = camera.get('jpeg')
+                if frame_bytes is not None:
                     yield (b'--frame\r\n'
                            b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            time.sleep(0.1)  # Limit streaming FPS
+                
+                time.sleep(0.1)  # Limit streaming FPS
+        finally:
+            with camera['frame_ready']:
+                camera['viewers'] -= 1
     
     def start_streaming_server(self):
         """Start Flask streaming server"""
@@ -800,7 +1452,7 @@ class CCTVSystem:
         if camera['recording']:
             return
         
-        camera['recording'] = True
+        self.set_camera_state(cam_id, recording=True)
         
         # Start recording thread
         record_thread = threading.Thread(
@@ -809,6 +1461,7 @@ class CCTVSystem:
             daemon=True
         )
         record_thread.start()
+        self.recording_threads[cam_id] = record_thread
         
         logger.info(f"Started recording for camera {cam_id}")
     
@@ -817,15 +1470,21 @@ class CCTVSystem:
         if cam_id not in self.cameras:
             return
         
-        camera = self.cameras[cam_id]
-        camera['recording'] = False
+        self.set_camera_state(cam_id, recording=False)
         
         logger.info(f"Stopped recording for camera {cam_id}")
     
     def record_camera(self, cam_id):
-        """Record video from camera"""
+        """Record video from camera in consecutive clips until recording stops"""
+        camera = self.cameras[cam_id]
+        
+        # The capture stays open across clips; only the writer is rotated
+        while camera['recording'] and self.running:
+            self.record_clip(cam_id)
+    
+    def record_clip(self, cam_id):
+        """Record one clip of at most the configured duration"""
         camera = self.cameras[cam_id]
-        cap = camera['capture']
         
         timestamp = datetime.datetime.now()
         filename = f"{cam_id}_{timestamp.strftime('%Y%m%d_%H%M%S')}.mp4"
@@ -835,61 +1494,124 @@ class CCTVSystem:
         
         video_path = recordings_dir / filename
         
-        # Initialize video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        # Initialize video writer at the size frames actually arrive in
         fps = camera['config']['fps']
-        frame_size = tuple(camera['config']['resolution'])
+        height, width = camera['frame_ring'][0].shape[:2]
         
-        out = cv2.VideoWriter(str(video_path), fourcc, fps, frame_size)
+        out = self.open_video_writer(video_path, fps, (width, height))
         
-        start_time = time.time()
-        duration = self.config['recording']['duration']
+        start_time = time.monotonic()
+        end_time = start_time + self.config['recording']['duration']
+        frames_written = 0
         
         while (camera['recording'] and 
-               time.time() - start_time < duration and
+               time.monotonic() < end_time and
                self.running):
             
+            # The encoder runs at a constant rate, so a stalled camera repeats its last frame
             if camera['last_frame'] is not None:
                 out.write(camera['last_frame'])
+            frames_written += 1
             
-            time.sleep(1 / fps)
+            # Wait until the next frame's deadline so write time doesn't accumulate as drift;
+            # shutdown wakes the wait immediately
+            delay = start_time + frames_written / fps - time.monotonic()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
         
         out.release()
         
-        # Log recording
-        file_size = os.path.getsize(video_path) if video_path.exists() else 0
-        actual_duration = int(time.time() - start_time)
+        # Log recording; one stat both sizes the file and confirms the encoder wrote it
+        actual_duration = int(time.monotonic() - start_time)
+        try:
+            file_size = os.stat(video_path).st_size
+        except OSError as e:
+            logger.error(f"Recording {video_path} was not written: {e}")
+            return
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO recordings 
-            (camera_id, file_path, duration, file_size)
-            VALUES (?, ?, ?, ?)
-        ''', (cam_id, str(video_path), actual_duration, file_size))
-        conn.commit()
-        conn.close()
+        self.log_recording(cam_id, video_path, actual_duration, file_size)
         
         logger.info(f"Recording saved: {video_path}")
     
-    def publish_system_status(self, status="running"):
-        """Publish system status to MQTT"""
-        status_data = {
-            'status': status,
-            'timestamp': datetime.datetime.now().isoformat(),
-            'cameras': {
-                cam_id: {
-                    'active': cam['active'],
-                    'recording': cam.get('recording', False)
-                }
-                for cam_id, cam in self.cameras.items()
-            }
-        }
+    def open_video_writer(self, video_path, fps, frame_size):
+        """Open an FFmpeg encoder pipe, falling back to cv2.VideoWriter without FFmpeg"""
+        encoder = select_ffmpeg_encoder(self.config['recording'].get('encoder', 'h264_nvenc'))
+        if encoder is None:
+            logger.warning("FFmpeg not found, recording with cv2.VideoWriter")
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            return cv2.VideoWriter(str(video_path), fourcc, fps, frame_size)
+        
+        return FFmpegWriter(video_path, fps, frame_size, encoder)
+    
+    def set_camera_state(self, cam_id, **state):
+        """Update a camera's active/recording flags, publishing just that camera if they changed"""
+        camera = self.cameras[cam_id]
+        changed = {key: value for key, value in state.items() if camera.get(key) != value}
+        if not changed:
+            return
+        
+        camera.update(changed)
+        self.status_dirty = True
         
+        # Per-camera retained status lets subscribers follow one camera without the full snapshot
         self.mqtt_client.publish(
+            f"{self.config['mqtt']['topics']['camera_status']}/{cam_id}",
+            json_dumps({'active': camera['active'], 'recording': camera['recording']}),
+            qos=0,
+            retain=True
+        )
+    
+    def publish_system_status(self, status="running"):
+        """Publish system status to MQTT"""
+        # Update the status payload in place rather than rebuilding it
+        status_data = self.status_data
+        status_data['status'] = status
+        status_data['timestamp'] = datetime.datetime.now().isoformat()
+        
+        # Camera entries only need refreshing after a state change
+        if self.status_dirty:
+            self.status_dirty = False
+            cameras = status_data['cameras']
+            for cam_id, cam in self.cameras.items():
+                entry = cameras.get(cam_id)
+                if entry is None:
+                    entry = cameras[cam_id] = {}
+                entry['active'] = cam['active']
+                entry['recording'] = cam.get('recording', False)
+        
+        # Retained, so subscribers get the latest status on connect without a QoS handshake;
+        # publish() only queues the message, so check the result instead of waiting on it
+        info = self.mqtt_client.publish(
             self.config['mqtt']['topics']['camera_status'],
-            json.dumps(status_data)
+            json_dumps(status_data),
+            qos=0,
+            retain=True
         )
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            logger.warning(f"Failed to publish system status: {mqtt.error_string(info.rc)}")
+    
+    def schedule_cleanup(self):
+        """Arm a timer for the next nightly recordings cleanup"""
+        now = datetime.datetime.now()
+        next_run = now.replace(hour=CLEANUP_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += datetime.timedelta(days=1)
+        
+        self.cleanup_timer = threading.Timer(
+            (next_run - now).total_seconds(), self.nightly_cleanup
+        )
+        self.cleanup_timer.daemon = True
+        self.cleanup_timer.start()
+    
+    def nightly_cleanup(self):
+        """Clean up old recordings, then re-arm for the next night"""
+        try:
+            self.cleanup_old_recordings()
+        except Exception as e:
+            logger.error(f"Error cleaning up old recordings: {e}")
+        
+        if self.running:
+            self.schedule_cleanup()
     
     def cleanup_old_recordings(self):
         """Clean up old recordings based on retention policy"""
@@ -899,50 +1621,97 @@ class CCTVSystem:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Find old recordings
-        cursor.execute('''
-            SELECT file_path FROM recordings 
-            WHERE timestamp < ?
-        ''', (cutoff_date,))
-        
-        old_recordings = cursor.fetchall()
-        
-        for (file_path,) in old_recordings:
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Deleted old recording: {file_path}")
-            except Exception as e:
-                logger.error(f"Failed to delete {file_path}: {e}")
-        
-        # Remove from database
-        cursor.execute('''
-            DELETE FROM recordings 
-            WHERE timestamp < ?
-        ''', (cutoff_date,))
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            # Read and remove old recordings in a single index range walk
+            cursor.execute('''
+                DELETE FROM recordings 
+                WHERE timestamp < ?
+                RETURNING file_path
+            ''', (cutoff_date,))
+            old_recordings = cursor.fetchall()
+            conn.commit()
+        else:
+            # Find old recordings
+            cursor.execute('''
+                SELECT file_path FROM recordings 
+                WHERE timestamp < ?
+            ''', (cutoff_date,))
+            old_recordings = cursor.fetchall()
+            
+            # Remove from database
+            cursor.execute('''
+                DELETE FROM recordings 
+                WHERE timestamp < ?
+            ''', (cutoff_date,))
+            conn.commit()
         
-        conn.commit()
+        # Reclaim freed pages without a full VACUUM; each step of the pragma frees one page
+        cursor.execute(f'PRAGMA incremental_vacuum({CLEANUP_VACUUM_PAGES})').fetchall()
         conn.close()
+        
+        # Unlinks block on filesystem metadata I/O, so overlap them
+        with ThreadPoolExecutor(max_workers=CLEANUP_WORKERS) as pool:
+            list(pool.map(self.delete_recording_file, [file_path for (file_path,) in old_recordings]))
+    
+    def delete_recording_file(self, file_path):
+        """Delete one recording file, logging rather than raising on failure"""
+        try:
+            # Drop the clip's cached pages first so the unlink doesn't evict them synchronously
+            if hasattr(os, 'posix_fadvise'):
+                fd = os.open(file_path, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                finally:
+                    os.close(fd)
+            
+            os.remove(file_path)
+            logger.info(f"Deleted old recording: {file_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to delete {file_path}: {e}")
     
     def stop_surveillance(self):
         """Stop the surveillance system"""
         logger.info("Stopping CCTV surveillance system")
         self.running = False
+        self.stop_event.set()
+        
+        if self.cleanup_timer is not None:
+            self.cleanup_timer.cancel()
         
         # Stop all cameras
         for cam_id, camera in self.cameras.items():
-            camera['active'] = False
-            camera['recording'] = False
+            self.set_camera_state(cam_id, active=False, recording=False)
             if 'capture' in camera:
                 camera['capture'].release()
         
-        # Disconnect MQTT
-        self.mqtt_client.loop_stop()
-        self.mqtt_client.disconnect()
+        # Stop face workers and release shared memory
+        if self.face_pool is not None:
+            self.face_pool.shutdown(wait=False, cancel_futures=True)
+            for shm in [self.known_shm] + [camera.get('face_shm') for camera in self.cameras.values()]:
+                if shm is not None:
+                    try:
+                        shm.close()
+                        shm.unlink()
+                    except (BufferError, FileNotFoundError) as e:
+                        logger.warning(f"Could not release shared memory {shm.name}: {e}")
+        
+        # Let recordings finish their file and queue their row before the writer stops
+        for record_thread in self.recording_threads.values():
+            record_thread.join(timeout=5)
         
-        # Publish offline status
+        # Flush queued events
+        self.db_writer_queue.put(None)
+        self.db_writer_thread.join(timeout=5)
+        
+        # Publish offline status while the client can still send it
         self.publish_system_status("offline")
         
+        # Disconnect MQTT; the network loop flushes the queued status first
+        self.mqtt_client.disconnect()
+        self.mqtt_client.loop_stop()
+        
         logger.info("CCTV surveillance system stopped")
 
 def main():
@@ -958,14 +1727,8 @@ def main():
     try:
         cctv.start_surveillance()
         
-        # Keep running
-        while True:
-            time.sleep(1)
-            
-            # Cleanup old recordings daily
-            if datetime.datetime.now().hour == 2:  # 2 AM
-                cctv.cleanup_old_recordings()
-                time.sleep(3600)  # Wait an hour
+        # Keep running until stopped; cleanup runs on its own timer
+        cctv.stop_event.wait()
     
     except KeyboardInterrupt:
         logger.info("Received shutdown signal")
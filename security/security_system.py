@@ -13,6 +13,10 @@ import sqlite3
 import hashlib
 import time
 import threading
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import json
 import os
 from datetime import datetime, timedelta
@@ -36,20 +40,163 @@ except ImportError:
     FINGERPRINT_AVAILABLE = False
     print("Fingerprint sensor library not available")
 
+# Optional JIT for nearest-face search over large enrolments
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Seconds between PRAGMA optimize runs on the security database
+DB_OPTIMIZE_INTERVAL = 900
+
+# Frames between face checks on a scene without motion
+FACE_IDLE_INTERVAL = 30
+
+# Known faces above which matching uses the compiled nearest_face kernel
+NUMBA_FACE_THRESHOLD = 1000
+
+# A face box overlapping a recognized face from the last second reuses its result
+FACE_TRACK_IOU = 0.6
+FACE_TRACK_MAX_AGE = 1.0  # seconds
+
+# Intrusion evidence JPEG encoding, done off the camera threads
+EVIDENCE_JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+EVIDENCE_WORKERS = 2
+
+# V4L2 MJPEG capture decoded by GStreamer; appsink keeps only the newest frame
+GSTREAMER_CAPTURE_PIPELINE = (
+    "v4l2src device=/dev/video{device} ! "
+    "image/jpeg,width={width},height={height},framerate={fps}/1 ! "
+    "{decoder} ! videoconvert ! video/x-raw,format=BGR ! "
+    "appsink drop=1 max-buffers=1"
+)
+
+# Log inserts, written in batches by the log writer thread
+INSERT_ACCESS_LOG_SQL = """
+    INSERT INTO access_logs (user_id, access_method, location, success, confidence)
+    VALUES (?, ?, ?, ?, ?)
+"""
+UPDATE_LAST_ACCESS_SQL = """
+    UPDATE users SET last_access = CURRENT_TIMESTAMP WHERE id = ?
+"""
+INSERT_SECURITY_EVENT_SQL = """
+    INSERT INTO security_events (event_type, description, location, severity, image_path)
+    VALUES (?, ?, ?, ?, ?)
+"""
+INSERT_INTRUSION_SQL = """
+    INSERT INTO intrusion_attempts (location, detection_method, confidence, image_path)
+    VALUES (?, ?, ?, ?)
+"""
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL = 0.1  # seconds
+
+def face_encoding_to_blob(encoding):
+    """Store a face encoding as its raw little-endian float32 bytes"""
+    return np.asarray(encoding, dtype='<f4').tobytes()
+
+def face_encoding_from_blob(blob):
+    """Load a face encoding from raw float32 or float64 bytes, or from a legacy pickled array"""
+    if len(blob) == 128 * 4:
+        return np.frombuffer(blob, dtype='<f4')
+    if len(blob) == 128 * 8:
+        return np.frombuffer(blob, dtype='<f8').astype(np.float32)
+    return np.asarray(pickle.loads(blob), dtype=np.float32)
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def nearest_face(known_matrix, encoding):
+        """Return the index of the closest known encoding and its squared distance"""
+        distances = np.empty(known_matrix.shape[0], np.float32)
+        for i in prange(known_matrix.shape[0]):
+            distance = np.float32(0.0)
+            for k in range(known_matrix.shape[1]):
+                diff = known_matrix[i, k] - encoding[k]
+                distance += diff * diff
+            distances[i] = distance
+        best = distances.argmin()
+        return best, distances[best]
+
+def box_iou(box1, box2):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, right = max(box1[0], box2[0]), min(box1[1], box2[1])
+    bottom, left = min(box1[2], box2[2]), max(box1[3], box2[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+    area1 = (box1[1] - box1[3]) * (box1[2] - box1[0])
+    area2 = (box2[1] - box2[3]) * (box2[2] - box2[0])
+    return intersection / float(area1 + area2 - intersection)
+
+def match_track(location, tracked_locations):
+    """Index of the tracked box overlapping location by more than FACE_TRACK_IOU, or None"""
+    best, best_iou = None, FACE_TRACK_IOU
+    for index, tracked in enumerate(tracked_locations):
+        iou = box_iou(location, tracked)
+        if iou > best_iou:
+            best, best_iou = index, iou
+    return best
+
+def encode_faces(frame, scale, tracked_locations=()):
+    """Locate faces in a BGR frame with HOG and encode the untracked ones at full resolution"""
+    # Find faces on a downscaled copy; detector cost scales with pixel count
+    if scale != 1.0:
+        small_frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        face_locations = [
+            (int(top / scale), int(right / scale), int(bottom / scale), int(left / scale))
+            for top, right, bottom, left in face_recognition.face_locations(rgb_small_frame)
+        ]
+        rgb_frame = None
+    else:
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        face_locations = face_recognition.face_locations(rgb_frame)
+    
+    return face_locations, encode_untracked_faces(frame, face_locations, tracked_locations, rgb_frame)
+
+def encode_untracked_faces(frame, face_locations, tracked_locations=(), rgb_frame=None):
+    """Encode the faces not matching a tracked box, with None in place of tracked ones"""
+    untracked = [
+        location for location in face_locations
+        if match_track(location, tracked_locations) is None
+    ]
+    
+    # Most frames have no new faces, so skip the full-size RGB copy for them
+    if not untracked:
+        return [None] * len(face_locations)
+    
+    # Encode at full resolution for accurate matching
+    if rgb_frame is None:
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    encodings = iter(face_recognition.face_encodings(rgb_frame, untracked))
+    return [
+        next(encodings) if match_track(location, tracked_locations) is None else None
+        for location in face_locations
+    ]
+
+def encode_faces_worker(shm_name, shape, scale, tracked_locations=()):
+    """Run encode_faces in a worker process on a frame published through shared memory"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frame = np.ndarray(shape, np.uint8, buffer=shm.buf)
+        result = encode_faces(frame, scale, tracked_locations)
+        del frame
+        return result
+    finally:
+        shm.close()
+
 class SecuritySystem:
     def __init__(self, config_file="security_config.json"):
-        self.load_config(config_file)
-        self.setup_logging()
-        self.initialize_database()
-        self.initialize_face_recognition()
-        self.initialize_biometric_scanner()
-        self.initialize_mqtt()
-        self.initialize_ai_detection()
-        
-        # Security state
+        # Security state, set before initialization loads known faces into it
         self.system_armed = False
         self.authorized_users = []
         self.face_encodings = {}
+        self.known_face_matrix = ([], [], np.empty((0, 128), np.float32))
+        self.face_net = None
+        self.face_pool = None
+        self.face_shms = {}
+        self.face_tracks = {}
+        self.evidence_pool = ThreadPoolExecutor(max_workers=EVIDENCE_WORKERS)
         self.fingerprint_templates = {}
         self.intrusion_detected = False
         self.failed_attempts = defaultdict(int)
@@ -59,6 +206,14 @@ class SecuritySystem:
         self.cameras = {}
         self.recording_threads = {}
         
+        self.load_config(config_file)
+        self.setup_logging()
+        self.initialize_database()
+        self.initialize_face_recognition()
+        self.initialize_biometric_scanner()
+        self.initialize_mqtt()
+        self.initialize_ai_detection()
+        
         print("Advanced Security System Initialized!")
         
     def load_config(self, config_file):
@@ -85,7 +240,10 @@ class SecuritySystem:
                 },
                 "recognition": {
                     "face_threshold": 0.6,
-                    "detection_interval": 1.0,
+                    "detection_scale": 0.25,
+                    "process_pool": True,
+                    "face_detector": "hog",
+                    "dnn_confidence": 0.5,
                     "max_failed_attempts": 3,
                     "lockout_duration": 300
                 },
@@ -94,6 +252,13 @@ class SecuritySystem:
                     "recording_duration": 30,
                     "storage_days": 30,
                     "video_format": "mp4"
+                },
+                "capture": {
+                    "gstreamer": True,
+                    "jpeg_decoder": "jpegdec",
+                    "width": 1920,
+                    "height": 1080,
+                    "fps": 30
                 }
             }
             
@@ -115,6 +280,13 @@ class SecuritySystem:
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.cursor = self.conn.cursor()
         
+        # WAL so camera thread writes don't block status reads; fewer fsyncs per commit
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
+        self.cursor.execute("PRAGMA temp_store=MEMORY")
+        self.cursor.execute("PRAGMA cache_size=-64000")
+        self.cursor.execute("PRAGMA mmap_size=268435456")
+        
         # Create tables
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -168,18 +340,106 @@ class SecuritySystem:
             )
         """)
         
+        # Latest-event and per-user access lookups walk these instead of scanning
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sec_events_ts
+            ON security_events (timestamp DESC)
+        """)
+        
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_access_user_ts
+            ON access_logs (user_id, timestamp DESC)
+        """)
+        
         self.conn.commit()
         
+        # Gather planner statistics once; PRAGMA optimize keeps them current afterwards
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        if self.cursor.fetchone() is None:
+            self.cursor.execute("ANALYZE")
+            self.conn.commit()
+        
+        # Keep query planner statistics fresh
+        self.optimize_timer = None
+        self.schedule_database_optimize()
+        
+        # Logs are inserted in batches by a single writer thread
+        self.log_queue = queue.Queue()
+        self.log_writer_thread = threading.Thread(target=self.log_writer, daemon=True)
+        self.log_writer_thread.start()
+        
+    def queue_log(self, sql, params):
+        """Queue a log row for the writer thread"""
+        self.log_queue.put((sql, params))
+        
+    def log_writer(self):
+        """Insert queued log rows, committing every 256 rows or 100 ms"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        
+        running = True
+        while running:
+            entry = self.log_queue.get()
+            if entry is None:
+                break
+                
+            batch = [entry]
+            deadline = time.time() + LOG_FLUSH_INTERVAL
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    entry = self.log_queue.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    running = False
+                    break
+                batch.append(entry)
+                
+            # One executemany per statement, all in a single transaction
+            rows_by_sql = {}
+            for sql, params in batch:
+                rows_by_sql.setdefault(sql, []).append(params)
+                
+            try:
+                with conn:
+                    for sql, rows in rows_by_sql.items():
+                        conn.executemany(sql, rows)
+            except Exception as e:
+                self.logger.error(f"Error writing security logs: {e}")
+                
+        conn.close()
+        
+    def schedule_database_optimize(self):
+        """Arm a timer for the next PRAGMA optimize"""
+        self.optimize_timer = threading.Timer(DB_OPTIMIZE_INTERVAL, self.optimize_database)
+        self.optimize_timer.daemon = True
+        self.optimize_timer.start()
+        
+    def optimize_database(self):
+        """Run PRAGMA optimize, then re-arm the timer"""
+        try:
+            self.conn.execute("PRAGMA optimize")
+        except Exception as e:
+            self.logger.error(f"Database optimize error: {e}")
+            
+        self.schedule_database_optimize()
+        
     def initialize_face_recognition(self):
         """Initialize face recognition system"""
         try:
             # Load known face encodings
             self.load_known_faces()
             
-            # Initialize face detection cascade
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
+            # Initialize SSD face detector, used instead of HOG when configured
+            self.face_net = cv2.dnn.readNetFromCaffe(
+                'models/deploy.prototxt',
+                'models/res10_300x300_ssd_iter_140000.caffemodel'
+            ) if os.path.exists('models/res10_300x300_ssd_iter_140000.caffemodel') else None
+            if self.face_net is not None:
+                self.select_dnn_backend(self.face_net)
+                
+            # Let OpenCV's parallel loops use every core
+            cv2.setNumThreads(cv2.getNumberOfCPUs())
             
             # Initialize face recognition model
             self.face_recognition_model = cv2.face.LBPHFaceRecognizer_create()
@@ -231,12 +491,36 @@ class SecuritySystem:
             # Load pre-trained models for object detection
             self.ai_models = {}
             
-            # Initialize person detection model
-            self.ai_models['person_detector'] = cv2.dnn.readNetFromDarknet(
-                'models/yolov3.cfg',
-                'models/yolov3.weights'
-            ) if os.path.exists('models/yolov3.weights') else None
-            
+            # Initialize person detection model, preferring the int8 MobileNet-SSD over YOLOv3 FP32
+            person_detector = None
+            self.person_detector_type = 'yolo'
+            if os.path.exists('models/ssd_mobilenet_v2_int8.bin'):
+                try:
+                    # OpenVINO IR only runs on the Inference Engine backend
+                    person_detector = cv2.dnn.readNet(
+                        'models/ssd_mobilenet_v2_int8.xml',
+                        'models/ssd_mobilenet_v2_int8.bin'
+                    )
+                    person_detector.setPreferableBackend(cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE)
+                    person_detector.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+                    self.person_detector_type = 'ssd'
+                except Exception as e:
+                    self.logger.warning(f"Int8 SSD unavailable, falling back to YOLOv3: {e}")
+                    person_detector = None
+                    
+            if person_detector is None and os.path.exists('models/yolov3.weights'):
+                person_detector = cv2.dnn.readNetFromDarknet(
+                    'models/yolov3.cfg',
+                    'models/yolov3.weights'
+                )
+                # Run on the GPU when possible
+                self.select_dnn_backend(person_detector)
+                
+            # Compute only the output layers
+            self.ai_models['person_detector'] = person_detector
+            if person_detector is not None:
+                self.person_output_layers = person_detector.getUnconnectedOutLayersNames()
+                
             # Initialize suspicious activity detection
             self.ai_models['activity_classifier'] = joblib.load(
                 'models/activity_classifier.pkl'
@@ -246,6 +530,18 @@ class SecuritySystem:
         except Exception as e:
             self.logger.error(f"AI model initialization error: {e}")
             
+    def select_dnn_backend(self, net):
+        """Run a DNN on CUDA, else OpenCL, else the CPU"""
+        if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16)
+        elif cv2.ocl.haveOpenCL():
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
+        else:
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            
     def on_mqtt_connect(self, client, userdata, flags, rc):
         """MQTT connection callback"""
         if rc == 0:
@@ -288,12 +584,13 @@ class SecuritySystem:
             self.face_encodings = {}
             for user_id, name, encoding_blob in users:
                 if encoding_blob:
-                    encoding = pickle.loads(encoding_blob)
+                    encoding = face_encoding_from_blob(encoding_blob)
                     self.face_encodings[user_id] = {
                         'name': name,
                         'encoding': encoding
                     }
                     
+            self.rebuild_face_matrix()
             self.logger.info(f"Loaded {len(self.face_encodings)} known faces")
         except Exception as e:
             self.logger.error(f"Error loading known faces: {e}")
@@ -319,7 +616,7 @@ class SecuritySystem:
                 fingerprint_template = self.scan_fingerprint_for_enrollment()
                 
             # Store in database
-            face_blob = pickle.dumps(face_encoding) if face_encoding is not None else None
+            face_blob = face_encoding_to_blob(face_encoding) if face_encoding is not None else None
             fingerprint_blob = pickle.dumps(fingerprint_template) if fingerprint_template else None
             
             self.cursor.execute("""
@@ -336,6 +633,7 @@ class SecuritySystem:
                     'name': name,
                     'encoding': face_encoding
                 }
+                self.rebuild_face_matrix()
                 
             self.logger.info(f"User {name} added successfully with ID {user_id}")
             return user_id
@@ -344,6 +642,24 @@ class SecuritySystem:
             self.logger.error(f"Error adding user {name}: {e}")
             return None
             
+    def rebuild_face_matrix(self):
+        """Stack known encodings into one matrix for vectorized matching"""
+        user_ids = list(self.face_encodings.keys())
+        names = [self.face_encodings[user_id]['name'] for user_id in user_ids]
+        if user_ids:
+            matrix = np.ascontiguousarray(
+                np.stack([self.face_encodings[user_id]['encoding'] for user_id in user_ids]),
+                dtype=np.float32
+            )
+        else:
+            matrix = np.empty((0, 128), np.float32)
+            
+        # Swapped in as one tuple so camera threads never see ids and rows out of step
+        self.known_face_matrix = (user_ids, names, matrix)
+        
+        # Results cached against the old set may be stale, e.g. a newly enrolled face
+        self.face_tracks = {}
+        
     def scan_fingerprint_for_enrollment(self):
         """Scan fingerprint for user enrollment"""
         if not self.fingerprint_scanner:
@@ -370,41 +686,87 @@ class SecuritySystem:
             self.logger.error(f"Fingerprint enrollment error: {e}")
             return None
             
-    def detect_faces_in_frame(self, frame):
+    def detect_faces_dnn(self, frame):
+        """Locate faces with the SSD face detector as (top, right, bottom, left) boxes"""
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0)
+        )
+        self.face_net.setInput(blob)
+        detections = self.face_net.forward()[0, 0]
+        
+        # Rows are (image, class, confidence, left, top, right, bottom) in relative coordinates
+        detections = detections[detections[:, 2] > self.config["recognition"].get("dnn_confidence", 0.5)]
+        boxes = np.clip(detections[:, 3:7], 0.0, 1.0) * [width, height, width, height]
+        
+        return [
+            (int(top), int(right), int(bottom), int(left))
+            for left, top, right, bottom in boxes
+        ]
+        
+    def detect_faces_in_frame(self, frame, scale=None, camera_id=None):
         """Detect and recognize faces in video frame"""
         try:
-            # Convert to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Find faces
-            face_locations = face_recognition.face_locations(rgb_frame)
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-            
+            if scale is None:
+                scale = self.config["recognition"].get("detection_scale", 1.0)
+                
+            # This camera's faces encoded within the last second; overlapping boxes reuse them
+            now = time.time()
+            tracks = [
+                track for track in self.face_tracks.get(camera_id, [])
+                if now - track['encoded_at'] < FACE_TRACK_MAX_AGE
+            ] if camera_id is not None else []
+            tracked_locations = [track['location'] for track in tracks]
+            
+            # One SSD forward pass on a 300x300 blob replaces the HOG scan
+            if self.face_net is not None and self.config["recognition"].get("face_detector") == "dnn":
+                face_locations = self.detect_faces_dnn(frame)
+                face_encodings = encode_untracked_faces(frame, face_locations, tracked_locations)
+                
+            # HOG detection and encoding in this camera's worker process, off the GIL
+            elif self.face_pool is not None and camera_id is not None:
+                face_locations, face_encodings = self.encode_faces_in_pool(
+                    camera_id, frame, scale, tracked_locations
+                )
+            else:
+                face_locations, face_encodings = encode_faces(frame, scale, tracked_locations)
+                
             detected_faces = []
+            new_tracks = []
+            user_ids, names, known_matrix = self.known_face_matrix
+            tolerance = self.config["recognition"]["face_threshold"]
             
             for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                matches = face_recognition.compare_faces(
-                    [data['encoding'] for data in self.face_encodings.values()],
-                    face_encoding,
-                    tolerance=self.config["recognition"]["face_threshold"]
-                )
-                
                 name = "Unknown"
                 confidence = 0.0
                 user_id = None
+                encoded_at = now
                 
-                if True in matches:
-                    match_index = matches.index(True)
-                    user_ids = list(self.face_encodings.keys())
-                    user_id = user_ids[match_index]
-                    name = self.face_encodings[user_id]['name']
+                if face_encoding is None:
+                    # Same face as a recent track; follow its box but keep its encoding time
+                    track = tracks[match_track((top, right, bottom, left), tracked_locations)]
+                    user_id, name, confidence = track['user_id'], track['name'], track['confidence']
+                    encoded_at = track['encoded_at']
                     
-                    # Calculate confidence
-                    face_distances = face_recognition.face_distance(
-                        [self.face_encodings[user_id]['encoding']],
-                        face_encoding
-                    )
-                    confidence = 1.0 - face_distances[0]
+                elif user_ids:
+                    probe = face_encoding.astype(np.float32)
+                    
+                    # Squared distance to every known face, threaded and SIMD-compiled for big sets
+                    if NUMBA_AVAILABLE and len(user_ids) > NUMBA_FACE_THRESHOLD:
+                        best, best_distance = nearest_face(known_matrix, probe)
+                    else:
+                        diffs = known_matrix - probe[np.newaxis, :]
+                        distances = np.einsum('ij,ij->i', diffs, diffs)
+                        best = distances.argmin()
+                        best_distance = distances[best]
+                    best = int(best)
+                    
+                    if best_distance <= tolerance ** 2:
+                        user_id = user_ids[best]
+                        name = names[best]
+                        
+                        # Calculate confidence
+                        confidence = 1.0 - float(np.sqrt(best_distance))
                     
                 detected_faces.append({
                     'user_id': user_id,
@@ -413,6 +775,16 @@ class SecuritySystem:
                     'location': (top, right, bottom, left),
                     'recognized': user_id is not None
                 })
+                new_tracks.append({
+                    'user_id': user_id,
+                    'name': name,
+                    'confidence': confidence,
+                    'location': (top, right, bottom, left),
+                    'encoded_at': encoded_at
+                })
+                
+            if camera_id is not None:
+                self.face_tracks[camera_id] = new_tracks
                 
             return detected_faces
             
@@ -420,6 +792,20 @@ class SecuritySystem:
             self.logger.error(f"Face detection error: {e}")
             return []
             
+    def encode_faces_in_pool(self, camera_id, frame, scale, tracked_locations=()):
+        """Copy a frame into the camera's shared memory and encode its faces in a worker process"""
+        shm = self.face_shms.get(camera_id)
+        if shm is None or shm.size < frame.nbytes:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = self.face_shms[camera_id] = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            
+        np.copyto(np.ndarray(frame.shape, np.uint8, buffer=shm.buf), frame)
+        return self.face_pool.submit(
+            encode_faces_worker, shm.name, frame.shape, scale, tracked_locations
+        ).result()
+        
     def verify_fingerprint(self):
         """Verify fingerprint against enrolled templates"""
         if not self.fingerprint_scanner:
@@ -469,91 +855,113 @@ class SecuritySystem:
             blur = cv2.GaussianBlur(diff, (5, 5), 0)
             _, thresh = cv2.threshold(blur, 20, 255, cv2.THRESH_BINARY)
             
-            # Find contours
-            contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+            # No blob can exceed the area threshold if the changed pixels don't in total
+            motion_sensitivity = self.config["recording"]["motion_sensitivity"]
+            if cv2.countNonZero(thresh) <= motion_sensitivity:
+                return False, thresh
+                
+            # Label changed blobs in one C pass; stats row 0 is the background
+            _, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+            motion_detected = bool((stats[1:, cv2.CC_STAT_AREA] > motion_sensitivity).any())
             
-            motion_detected = False
-            for contour in contours:
-                if cv2.contourArea(contour) > self.config["recording"]["motion_sensitivity"]:
-                    motion_detected = True
-                    break
-                    
             return motion_detected, thresh
             
         except Exception as e:
             self.logger.error(f"Motion detection error: {e}")
             return False, None
             
-    def analyze_suspicious_activity(self, frame, motion_mask):
+    def analyze_suspicious_activity(self, frame, motion_mask, buffers=None):
         """Analyze frame for suspicious activities using AI"""
         try:
             if not self.ai_models.get('person_detector'):
                 return False, "No AI model available"
                 
             # Detect persons
-            blob = cv2.dnn.blobFromImage(frame, 0.00392, (416, 416), (0, 0, 0), True, crop=False)
-            self.ai_models['person_detector'].setInput(blob)
-            outputs = self.ai_models['person_detector'].forward()
+            persons = self.count_persons(frame, buffers)
             
             # Process detections
             suspicious_score = 0.0
             reasons = []
             
-            for output in outputs:
-                for detection in output:
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
+            if persons:
+                # Check time of day
+                current_hour = datetime.now().hour
+                if current_hour < 6 or current_hour > 22:
+                    suspicious_score += 0.3 * persons
+                    reasons.append("Activity during unusual hours")
                     
-                    if confidence > 0.5 and class_id == 0:  # Person detected
-                        # Check time of day
-                        current_hour = datetime.now().hour
-                        if current_hour < 6 or current_hour > 22:
-                            suspicious_score += 0.3
-                            reasons.append("Activity during unusual hours")
-                            
-                        # Check if system is armed
-                        if self.system_armed:
-                            suspicious_score += 0.5
-                            reasons.append("Movement while system armed")
-                            
-                        # Check loitering (staying in same area)
-                        # This would require tracking implementation
-                        
+                # Check if system is armed
+                if self.system_armed:
+                    suspicious_score += 0.5 * persons
+                    reasons.append("Movement while system armed")
+                    
+                # Check loitering (staying in same area)
+                # This would require tracking implementation
+                
             return suspicious_score > 0.5, reasons
             
         except Exception as e:
             self.logger.error(f"Suspicious activity analysis error: {e}")
             return False, ["Analysis error"]
             
+    def person_blob(self, frame, size, scale, buffers=None):
+        """Build a 1x3xHxW RGB input blob, reusing the resize and blob arrays in buffers"""
+        if buffers is None:
+            return cv2.dnn.blobFromImage(frame, scale, (size, size), (0, 0, 0), True, crop=False)
+            
+        if buffers.get('person_size') != size:
+            buffers['person_size'] = size
+            buffers['person_resized'] = np.empty((size, size, 3), np.uint8)
+            buffers['person_blob'] = np.empty((1, 3, size, size), np.float32)
+            
+        resized = cv2.resize(frame, (size, size), dst=buffers['person_resized'])
+        blob = buffers['person_blob']
+        
+        # Write the BGR->RGB planar layout straight into the reused blob
+        np.multiply(resized[:, :, ::-1].transpose(2, 0, 1), scale, out=blob[0], casting='unsafe')
+        return blob
+        
+    def count_persons(self, frame, buffers=None):
+        """Count confident person detections in frame"""
+        person_detector = self.ai_models['person_detector']
+        
+        if self.person_detector_type == 'ssd':
+            # MobileNet-SSD rows are (image, class, confidence, box); COCO class 1 is person
+            blob = self.person_blob(frame, 300, 1.0, buffers)
+            person_detector.setInput(blob)
+            detections = person_detector.forward()[0, 0]
+            return int(np.count_nonzero((detections[:, 1] == 1) & (detections[:, 2] > 0.5)))
+            
+        # YOLO rows are (box, objectness, class scores...); class 0 is person
+        blob = self.person_blob(frame, 416, 1 / 255.0, buffers)
+        person_detector.setInput(blob)
+        persons = 0
+        for output in person_detector.forward(self.person_output_layers):
+            scores = output[:, 5:]
+            class_ids = scores.argmax(axis=1)
+            confidences = scores[np.arange(len(scores)), class_ids]
+            persons += int(np.count_nonzero((class_ids == 0) & (confidences > 0.5)))
+        return persons
+        
     def log_access_attempt(self, user_id, method, location, success, confidence=0.0):
         """Log access attempt to database"""
         try:
-            self.cursor.execute("""
-                INSERT INTO access_logs (user_id, access_method, location, success, confidence)
-                VALUES (?, ?, ?, ?, ?)
-            """, (user_id, method, location, success, confidence))
+            self.queue_log(INSERT_ACCESS_LOG_SQL, (user_id, method, location, success, confidence))
             
             # Update last access time for successful attempts
             if success and user_id:
-                self.cursor.execute("""
-                    UPDATE users SET last_access = CURRENT_TIMESTAMP WHERE id = ?
-                """, (user_id,))
+                self.queue_log(UPDATE_LAST_ACCESS_SQL, (user_id,))
                 
-            self.conn.commit()
-            
         except Exception as e:
             self.logger.error(f"Error logging access attempt: {e}")
             
     def log_security_event(self, event_type, description, location, severity=1, image_path=None):
         """Log security event"""
         try:
-            self.cursor.execute("""
-                INSERT INTO security_events (event_type, description, location, severity, image_path)
-                VALUES (?, ?, ?, ?, ?)
-            """, (event_type, description, location, severity, image_path))
-            
-            self.conn.commit()
+            self.queue_log(
+                INSERT_SECURITY_EVENT_SQL,
+                (event_type, description, location, severity, image_path)
+            )
             
             # Send MQTT alert
             alert_data = {
@@ -584,15 +992,15 @@ class SecuritySystem:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 image_path = f"evidence/intrusion_{location}_{timestamp}.jpg"
                 os.makedirs("evidence", exist_ok=True)
-                cv2.imwrite(image_path, frame)
+                
+                # The camera thread decodes into this buffer again, so encode a copy
+                self.evidence_pool.submit(self.save_evidence, image_path, frame.copy())
                 
             # Log intrusion attempt
-            self.cursor.execute("""
-                INSERT INTO intrusion_attempts (location, detection_method, confidence, image_path)
-                VALUES (?, ?, ?, ?)
-            """, (location, detection_method, confidence, image_path))
-            
-            self.conn.commit()
+            self.queue_log(
+                INSERT_INTRUSION_SQL,
+                (location, detection_method, confidence, image_path)
+            )
             
             # Send emergency alert
             self.log_security_event(
@@ -611,6 +1019,17 @@ class SecuritySystem:
         except Exception as e:
             self.logger.error(f"Error handling intrusion: {e}")
             
+    def save_evidence(self, image_path, frame):
+        """Encode an evidence frame as JPEG and write it to image_path"""
+        try:
+            ok, encoded = cv2.imencode('.jpg', frame, EVIDENCE_JPEG_PARAMS)
+            if not ok:
+                raise ValueError("JPEG encoding failed")
+            with open(image_path, 'wb') as f:
+                f.write(encoded.tobytes())
+        except Exception as e:
+            self.logger.error(f"Error saving evidence {image_path}: {e}")
+            
     def trigger_alarm(self):
         """Trigger security alarm"""
         try:
@@ -654,10 +1073,35 @@ class SecuritySystem:
         self.log_security_event("SYSTEM_DISARMED", "Security system disarmed", "system")
         self.logger.info("Security system DISARMED")
         
+    def open_camera(self, camera_id):
+        """Open a camera through GStreamer MJPEG capture, falling back to the default backend"""
+        capture_config = self.config.get("capture", {})
+        
+        if isinstance(camera_id, int) and capture_config.get("gstreamer", False):
+            pipeline = GSTREAMER_CAPTURE_PIPELINE.format(
+                device=camera_id,
+                width=capture_config.get("width", 1920),
+                height=capture_config.get("height", 1080),
+                fps=capture_config.get("fps", 30),
+                decoder=capture_config.get("jpeg_decoder", "jpegdec")
+            )
+            cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            if cap.isOpened():
+                return cap
+            cap.release()
+            self.logger.info(f"GStreamer capture unavailable for camera {camera_id}, using default backend")
+            
+        # Keep a single queued frame so reads are never more than one frame stale
+        cap = cv2.VideoCapture(camera_id)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if isinstance(camera_id, int):
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        return cap
+        
     def start_monitoring(self, camera_id=0):
         """Start monitoring a specific camera"""
         try:
-            cap = cv2.VideoCapture(camera_id)
+            cap = self.open_camera(camera_id)
             self.cameras[camera_id] = cap
             
             # Start monitoring thread
@@ -678,53 +1122,100 @@ class SecuritySystem:
         cap = self.cameras[camera_id]
         previous_frame = None
         
+        # Two frame buffers decoded into in turn, so the previous frame needs no copy
+        buffers = [None, None]
+        index = 0
+        
+        # Person detector resize and blob arrays, reused across frames
+        person_buffers = {}
+        
+        # Motion runs on every frame; face and person detection run every detect_stride frames,
+        # with the stride tracking their measured cost so they keep up with the capture rate
+        frame_period = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30)
+        frame_index = 0
+        last_face_frame = -FACE_IDLE_INTERVAL
+        last_activity_frame = -1
+        detect_stride = 1
+        detect_cost = 0.0
+        fell_behind = False
+        
         while True:
             try:
-                ret, frame = cap.read()
+                # After a slow iteration the queued frame is stale; grab it without decoding
+                if fell_behind:
+                    cap.grab()
+                if not cap.grab():
+                    break
+                ret, frame = cap.retrieve() if buffers[index] is None else cap.retrieve(buffers[index])
                 if not ret:
                     break
                     
-                # Detect faces
-                faces = self.detect_faces_in_frame(frame)
-                
-                # Process detected faces
-                for face in faces:
-                    if face['recognized']:
-                        self.log_access_attempt(
-                            face['user_id'],
-                            'face_recognition',
-                            f"camera_{camera_id}",
-                            True,
-                            face['confidence']
-                        )
-                    elif self.system_armed:
-                        self.handle_intrusion(
-                            f"camera_{camera_id}",
-                            "unknown_face",
-                            face['confidence'],
-                            frame
-                        )
-                        
+                # retrieve() reallocates if the stream size changes
+                buffers[index] = frame
+                
+                # grab() blocks until the next frame, so only the time after it counts as falling behind
+                processing_started = time.time()
+                
                 # Detect motion
+                motion_detected, motion_mask = False, None
                 if previous_frame is not None:
                     motion_detected, motion_mask = self.detect_motion(previous_frame, frame)
                     
-                    if motion_detected and self.system_armed:
-                        # Analyze for suspicious activity
-                        is_suspicious, reasons = self.analyze_suspicious_activity(frame, motion_mask)
-                        
-                        if is_suspicious:
+                started = time.time()
+                detected = False
+                
+                # Detect faces when something moved, and on idle scenes every FACE_IDLE_INTERVAL frames
+                since_faces = frame_index - last_face_frame
+                if since_faces >= detect_stride and (motion_detected or since_faces >= FACE_IDLE_INTERVAL):
+                    last_face_frame = frame_index
+                    detected = True
+                    faces = self.detect_faces_in_frame(frame, camera_id=camera_id)
+                    
+                    # Process detected faces
+                    for face in faces:
+                        if face['recognized']:
+                            self.log_access_attempt(
+                                face['user_id'],
+                                'face_recognition',
+                                f"camera_{camera_id}",
+                                True,
+                                face['confidence']
+                            )
+                        elif self.system_armed:
                             self.handle_intrusion(
                                 f"camera_{camera_id}",
-                                "suspicious_motion",
-                                0.8,
+                                "unknown_face",
+                                face['confidence'],
                                 frame
                             )
                             
-                previous_frame = frame.copy()
-                
-                # Small delay to prevent overwhelming the system
-                time.sleep(self.config["recognition"]["detection_interval"])
+                if (motion_detected and self.system_armed
+                        and frame_index - last_activity_frame >= detect_stride):
+                    last_activity_frame = frame_index
+                    detected = True
+                    
+                    # Analyze for suspicious activity
+                    is_suspicious, reasons = self.analyze_suspicious_activity(
+                        frame, motion_mask, person_buffers
+                    )
+                    
+                    if is_suspicious:
+                        self.handle_intrusion(
+                            f"camera_{camera_id}",
+                            "suspicious_motion",
+                            0.8,
+                            frame
+                        )
+                        
+                # Moving average of detection cost, in frames, sets the stride
+                if detected:
+                    detect_cost = 0.8 * detect_cost + 0.2 * (time.time() - started)
+                    detect_stride = max(1, int(np.ceil(detect_cost / frame_period)))
+                    
+                previous_frame = frame
+                index = 1 - index
+                frame_index += 1
+                fell_behind = time.time() - processing_started > frame_period
                 
             except Exception as e:
                 self.logger.error(f"Camera {camera_id} monitoring error: {e}")
@@ -770,6 +1261,13 @@ class SecuritySystem:
         try:
             self.logger.info("Security system started")
             
+            # One face worker process per camera
+            if self.config["recognition"].get("process_pool", True):
+                self.face_pool = ProcessPoolExecutor(
+                    max_workers=len(self.config["cameras"]),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                
             # Start monitoring all configured cameras
             for camera_config in self.config["cameras"]:
                 self.start_monitoring(camera_config["id"])
@@ -792,7 +1290,21 @@ class SecuritySystem:
             for cap in self.cameras.values():
                 cap.release()
                 
-            # Close database
+            # Stop face workers and release their shared frames
+            if self.face_pool is not None:
+                self.face_pool.shutdown(wait=False, cancel_futures=True)
+            for shm in self.face_shms.values():
+                shm.close()
+                shm.unlink()
+                
+            # Let pending evidence images finish writing
+            self.evidence_pool.shutdown(wait=True)
+            
+            # Flush queued logs, then close database
+            self.log_queue.put(None)
+            self.log_writer_thread.join(timeout=5)
+            if self.optimize_timer is not None:
+                self.optimize_timer.cancel()
             self.conn.close()
             
             # Disconnect MQTT
@@ -14,6 +14,46 @@ def send_to_arduino(command):
 # Initialize the recognizer
 recognizer = sr.Recognizer()
 
+# Define the command mappings
+command_mappings = {
+    "open hall door": "hall_door_open",
+    "close hall door": "hall_door_close",
+    "open kitchen door": "kitchen_door_open",
+    "close kitchen door": "kitchen_door_close",
+    "open living room door": "living_room_door_open",
+    "close living room door": "living_room_door_close",
+    "turn on hall light": "hall_light_on",
+    "turn off hall light": "hall_light_off",
+    "turn on kitchen light": "kitchen_light_on",
+    "turn off kitchen light": "kitchen_light_off",
+    "turn on living room light": "living_room_light_on",
+    "turn off living room light": "living_room_light_off",
+    "turn on hall fan": "hall_fan_on",
+    "turn off hall fan": "hall_fan_off",
+    "turn on kitchen fan": "kitchen_fan_on",
+    "turn off kitchen fan": "kitchen_fan_off",
+    "turn on living room fan": "living_room_fan_on",
+    "turn off living room fan": "living_room_fan_off"
+}
+
+# Build an Aho-Corasick automaton so a phrase is found anywhere in the utterance in one scan
+try:
+    import ahocorasick
+    command_matcher = ahocorasick.Automaton()
+    for phrase, arduino_command in command_mappings.items():
+        command_matcher.add_word(phrase, arduino_command)
+    command_matcher.make_automaton()
+except ImportError:
+    command_matcher = None
+
+# Function to find the Arduino command for a recognized phrase
+def find_command(command):
+    if command_matcher is None:
+        return command_mappings.get(command)
+    for _, arduino_command in command_matcher.iter(command):
+        return arduino_command
+    return None
+
 # Function to recognize speech and process commands
 def recognize_and_process():
     with sr.Microphone() as source:
@@ -26,32 +66,11 @@ def recognize_and_process():
             command = command.lower()  # Convert the command to lowercase for consistency
             print(f"Recognized command: {command}")
 
-            # Define the command mappings
-            command_mappings = {
-                "open hall door": "hall_door_open",
-                "close hall door": "hall_door_close",
-                "open kitchen door": "kitchen_door_open",
-                "close kitchen door": "kitchen_door_close",
-                "open living room door": "living_room_door_open",
-                "close living room door": "living_room_door_close",
-                "turn on hall light": "hall_light_on",
-                "turn off hall light": "hall_light_off",
-                "turn on kitchen light": "kitchen_light_on",
-                "turn off kitchen light": "kitchen_light_off",
-                "turn on living room light": "living_room_light_on",
-                "turn off living room light": "living_room_light_off",
-                "turn on hall fan": "hall_fan_on",
-                "turn off hall fan": "hall_fan_off",
-                "turn on kitchen fan": "kitchen_fan_on",
-                "turn off kitchen fan": "kitchen_fan_off",
-                "turn on living room fan": "living_room_fan_on",
-                "turn off living room fan": "living_room_fan_off"
-            }
-
-            # Check if the command exists in our mappings
-            if command in command_mappings:
-                send_to_arduino(command_mappings[command])
-                print(f"Sent command to Arduino: {command_mappings[command]}")
+            # Check if the command contains one of our phrases
+            arduino_command = find_command(command)
+            if arduino_command:
+                send_to_arduino(arduino_command)
+                print(f"Sent command to Arduino: {arduino_command}")
             else:
                 print("Unknown command")
 
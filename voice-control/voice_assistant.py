@@ -9,44 +9,98 @@ import speech_recognition as sr
 import pyttsx3
 import json
 import threading
+import queue
 import time
 import requests
-import websocket
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import paho.mqtt.client as mqtt
 import numpy as np
-import wave
 import pyaudio
 from datetime import datetime
 import re
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-import openai
-import google.generativeai as genai
-from transformers import pipeline
+import os
+import hashlib
 import logging
+from enum import Enum
 
-# Download required NLTK data
+# Optional Vosk for on-device streaming recognition
 try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except:
-    pass
+    import vosk
+    VOSK_AVAILABLE = True
+except ImportError:
+    VOSK_AVAILABLE = False
+
+# Optional Porcupine for on-device wake word detection
+try:
+    import pvporcupine
+    PORCUPINE_AVAILABLE = True
+except ImportError:
+    PORCUPINE_AVAILABLE = False
+
+# Optional simpleaudio for replaying cached speech
+try:
+    import simpleaudio
+    SIMPLEAUDIO_AVAILABLE = True
+except ImportError:
+    SIMPLEAUDIO_AVAILABLE = False
+
+# Optional fast JSON encoding for MQTT payloads
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# paho-mqtt publishes either the bytes from orjson or the str from json; both parse bytes
+json_dumps = orjson.dumps if ORJSON_AVAILABLE else json.dumps
+json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+# Optional sounddevice for callback capture into a preallocated ring buffer
+try:
+    import sounddevice as sd
+    SOUNDDEVICE_AVAILABLE = True
+except ImportError:
+    SOUNDDEVICE_AVAILABLE = False
+
+# Optional WebRTC voice activity detection to skip recognition of silence
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
+# Optional Hyperscan for single-scan intent matching
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+# Boundary after a sentence, where streamed AI replies are handed to speech
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
 
 # Configuration
 class VoiceControlConfig:
     # API Keys (Replace with your actual keys)
     OPENAI_API_KEY = "your_openai_api_key_here"
     GOOGLE_API_KEY = "your_google_api_key_here"
+    PORCUPINE_ACCESS_KEY = "your_picovoice_access_key_here"
     
     # Network Configuration
     ESP32_IP = "192.168.1.100"  # Your ESP32 IP address
+    ESP32_HTTP_TIMEOUT = 2  # seconds
     MQTT_BROKER = "localhost"
     MQTT_PORT = 1883
     MQTT_TOPIC_COMMAND = "smarthome/voice"
+    MQTT_BATCH_WINDOW = 0.02  # seconds to coalesce commands into one publish
+    MQTT_BATCH_SIZE = 4
     
     # Voice Recognition Settings
     WAKE_WORDS = ["hey smart home", "smart home", "alexa", "google", "assistant"]
+    WAKE_WORD_BACKOFF_BASE = 0.25  # seconds after the first failure, doubled for each repeat
+    WAKE_WORD_BACKOFF_MAX = 30
+    PORCUPINE_KEYWORDS = ["alexa", "hey google", "computer", "jarvis"]  # Built-in Porcupine keywords
     LANGUAGES = {
         'en': 'english',
         'hi': 'hindi',
@@ -60,7 +114,105 @@ class VoiceControlConfig:
     CHUNK_SIZE = 1024
     RECORD_SECONDS = 5
     CONFIDENCE_THRESHOLD = 0.7
+    RECOGNITION_TIMEOUT = 3  # seconds before a cloud recognition request is abandoned
+    VAD_AGGRESSIVENESS = 2  # 0 (permissive) to 3 (strict)
+    VAD_FRAME_MS = 20
+    VAD_MIN_SPEECH_FRAMES = 3  # voiced frames needed before audio is sent for recognition
+    
+    # Canned responses are synthesized once to WAV at startup and replayed; other text is spoken live
+    TTS_CACHE_DIR = "tts_cache"
+    CANNED_RESPONSES = [
+        "Yes, I'm listening!",
+        "What can I help you with?",
+        "Sorry, I didn't understand that. Please try again.",
+        "I didn't hear anything. Try saying the wake word again.",
+        "Sorry, there was an error processing your command.",
+        "Security system armed.",
+        "Security system disarmed."
+    ]
+    
+    # On-device streaming recognition model (https://alphacephei.com/vosk/models)
+    VOSK_MODEL_PATH = "models/vosk-model-small-en-us-0.15"
 
+class WakeWordState(Enum):
+    LISTENING = 1
+    MATCHED = 2
+    BACKOFF = 3
+    
+class RingBufferInput:
+    """Microphone frames copied by a sounddevice callback into a preallocated int16 ring"""
+    
+    def __init__(self, sample_rate, frame_length, slots=16):
+        self.ring = np.zeros((slots, frame_length), dtype=np.int16)
+        self.write_index = 0
+        self.read_index = 0
+        self.available = threading.Semaphore(0)
+        self.stream = sd.RawInputStream(
+            samplerate=sample_rate,
+            blocksize=frame_length,
+            channels=1,
+            dtype='int16',
+            callback=self.callback
+        )
+        self.stream.start()
+        
+    def callback(self, indata, frames, time_info, status):
+        np.copyto(self.ring[self.write_index % len(self.ring)], np.frombuffer(indata, dtype=np.int16))
+        self.write_index += 1
+        self.available.release()
+        
+    def read(self):
+        """Return a view of the next frame, skipping any the reader fell a full ring behind on"""
+        while True:
+            self.available.acquire()
+            self.read_index = max(self.read_index, self.write_index - len(self.ring))
+            if self.read_index < self.write_index:
+                break
+        frame = self.ring[self.read_index % len(self.ring)]
+        self.read_index += 1
+        return frame
+        
+    def stop(self):
+        self.stream.stop()
+        
+    def start(self):
+        if self.stream.stopped:
+            # Frames captured before the pause are stale
+            self.read_index = self.write_index
+            self.stream.start()
+        
+    def close(self):
+        self.stream.close()
+        
+class PyAudioInput:
+    """Blocking PyAudio microphone frames as int16 arrays"""
+    
+    def __init__(self, sample_rate, frame_length):
+        self.frame_length = frame_length
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            rate=sample_rate,
+            channels=1,
+            format=pyaudio.paInt16,
+            input=True,
+            frames_per_buffer=frame_length
+        )
+        
+    def read(self):
+        pcm = self.stream.read(self.frame_length, exception_on_overflow=False)
+        return np.frombuffer(pcm, dtype=np.int16)
+        
+    def stop(self):
+        self.stream.stop_stream()
+        
+    def start(self):
+        if self.stream.is_stopped():
+            self.stream.start_stream()
+            
+    def close(self):
+        self.stream.close()
+        self.audio.terminate()
+        
 class SmartHomeVoiceAssistant:
     def __init__(self):
         self.config = VoiceControlConfig()
@@ -68,6 +220,7 @@ class SmartHomeVoiceAssistant:
         self.setup_speech_recognition()
         self.setup_text_to_speech()
         self.setup_mqtt()
+        self.setup_http()
         self.setup_ai_models()
         self.setup_command_mappings()
         
@@ -95,6 +248,7 @@ class SmartHomeVoiceAssistant:
         
     def setup_speech_recognition(self):
         self.recognizer = sr.Recognizer()
+        self.recognizer.operation_timeout = self.config.RECOGNITION_TIMEOUT
         self.microphone = sr.Microphone()
         
         # Adjust for ambient noise
@@ -102,6 +256,19 @@ class SmartHomeVoiceAssistant:
             print("Adjusting for ambient noise...")
             self.recognizer.adjust_for_ambient_noise(source, duration=2)
             
+        # Load the streaming model once; without it recognition falls back to cloud services
+        self.vosk_model = None
+        if VOSK_AVAILABLE and os.path.exists(self.config.VOSK_MODEL_PATH):
+            try:
+                vosk.SetLogLevel(-1)
+                self.vosk_model = vosk.Model(self.config.VOSK_MODEL_PATH)
+                self.logger.info("Vosk streaming recognition enabled")
+            except Exception as e:
+                self.logger.error(f"Vosk model load failed: {e}")
+                
+        # Voice activity detector gating cloud recognition of wake word audio
+        self.vad = webrtcvad.Vad(self.config.VAD_AGGRESSIVENESS) if WEBRTCVAD_AVAILABLE else None
+        
         # Setup wake word detection
         self.setup_wake_word_detection()
         
@@ -115,31 +282,127 @@ class SmartHomeVoiceAssistant:
         self.tts_engine.setProperty('rate', 150)  # Speech rate
         self.tts_engine.setProperty('volume', 0.8)  # Volume level
         
+        # Synthesize the canned responses up front so they play back without synthesis
+        self.tts_cache = {}
+        self.tts_cache_enabled = False
+        if SIMPLEAUDIO_AVAILABLE:
+            try:
+                os.makedirs(self.config.TTS_CACHE_DIR, exist_ok=True)
+                self.cache_speech(self.config.CANNED_RESPONSES)
+                self.tts_cache_enabled = True
+            except Exception as e:
+                self.logger.error(f"TTS cache setup failed: {e}")
+                
+        # The engine is driven only by this worker, so speaking never blocks the caller
+        self.tts_queue = queue.Queue()
+        self.tts_thread = threading.Thread(target=self.tts_worker, daemon=True)
+        self.tts_thread.start()
+                
+    def speech_cache_path(self, text):
+        """WAV path for text, keyed by the voice settings so changing them re-synthesizes"""
+        key = "|".join(str(value) for value in (
+            self.tts_engine.getProperty('voice'),
+            self.tts_engine.getProperty('rate'),
+            self.tts_engine.getProperty('volume'),
+            text
+        ))
+        return os.path.join(self.config.TTS_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".wav")
+        
+    def cache_speech(self, texts):
+        """Synthesize texts to WAV files in one engine run and load them into the cache"""
+        paths = {text: self.speech_cache_path(text) for text in texts}
+        pending = [text for text, path in paths.items() if not os.path.exists(path)]
+        for text in pending:
+            self.tts_engine.save_to_file(text, paths[text])
+        if pending:
+            self.tts_engine.runAndWait()
+            
+        for text, path in paths.items():
+            self.tts_cache[text] = simpleaudio.WaveObject.from_wave_file(path)
+        
     def setup_mqtt(self):
         self.mqtt_client = mqtt.Client()
         self.mqtt_client.on_connect = self.on_mqtt_connect
         self.mqtt_client.on_message = self.on_mqtt_message
         
+        # Bound the offline backlog and retry the broker quickly after a drop
+        self.mqtt_client.max_queued_messages_set(1000)
+        self.mqtt_client.reconnect_delay_set(min_delay=1, max_delay=5)
+        
         try:
             self.mqtt_client.connect(self.config.MQTT_BROKER, self.config.MQTT_PORT, 60)
             self.mqtt_client.loop_start()
         except Exception as e:
             self.logger.error(f"MQTT connection failed: {e}")
             
+        # Commands are coalesced and published by a single worker
+        self.publish_queue = queue.Queue()
+        self.publish_thread = threading.Thread(target=self.mqtt_publish_worker, daemon=True)
+        self.publish_thread.start()
+        
+    def mqtt_publish_worker(self):
+        """Publish queued commands, batching those sent within MQTT_BATCH_WINDOW of each other"""
+        running = True
+        while running:
+            item = self.publish_queue.get()
+            if item is None:
+                break
+                
+            batch = [item]
+            deadline = time.time() + self.config.MQTT_BATCH_WINDOW
+            while len(batch) < self.config.MQTT_BATCH_SIZE:
+                try:
+                    item = self.publish_queue.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+                
+            # A lone command keeps the single-object payload; scenes go out as one array
+            try:
+                # Fire-and-forget: QoS 0 has no PUBACK round-trip, and commands are never retained
+                self.mqtt_client.publish(
+                    self.config.MQTT_TOPIC_COMMAND,
+                    json_dumps(batch[0] if len(batch) == 1 else batch),
+                    qos=0,
+                    retain=False
+                )
+            except Exception as e:
+                self.logger.error(f"Error publishing commands: {e}")
+                
+    def setup_http(self):
+        # Keep-alive session so commands reuse the TCP connection to the ESP32
+        self.http_session = requests.Session()
+        self.http_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        
+        # Posts run here so send_command never waits on the network
+        self.http_pool = ThreadPoolExecutor(max_workers=2)
+        
     def setup_ai_models(self):
+        # Cloud AI clients are imported on first use, not at startup
+        self.openai = None
+        self.ai_clients_loaded = False
+        
+    def load_ai_clients(self):
+        """Import and configure the cloud AI clients the first time they are needed"""
+        if self.ai_clients_loaded:
+            return
+        self.ai_clients_loaded = True
+        
         try:
             # Setup OpenAI
             if self.config.OPENAI_API_KEY != "your_openai_api_key_here":
+                import openai
                 openai.api_key = self.config.OPENAI_API_KEY
+                self.openai = openai
                 
             # Setup Google Generative AI
             if self.config.GOOGLE_API_KEY != "your_google_api_key_here":
+                import google.generativeai as genai
                 genai.configure(api_key=self.config.GOOGLE_API_KEY)
                 
-            # Setup local NLP model
-            self.nlp_classifier = pipeline("text-classification", 
-                                         model="distilbert-base-uncased-finetuned-sst-2-english")
-            
             self.logger.info("AI models initialized successfully")
         except Exception as e:
             self.logger.error(f"AI model setup failed: {e}")
@@ -148,9 +411,13 @@ class SmartHomeVoiceAssistant:
         """Setup wake word detection using audio analysis"""
         self.wake_word_model = None
         try:
-            # You can integrate with libraries like snowboy, porcupine, or vosk
-            # For now, we'll use simple keyword matching
-            pass
+            # Porcupine spots the wake word on-device; otherwise fall back to keyword matching
+            if PORCUPINE_AVAILABLE and self.config.PORCUPINE_ACCESS_KEY != "your_picovoice_access_key_here":
+                self.wake_word_model = pvporcupine.create(
+                    access_key=self.config.PORCUPINE_ACCESS_KEY,
+                    keywords=self.config.PORCUPINE_KEYWORDS
+                )
+                self.logger.info("Porcupine wake word detection enabled")
         except Exception as e:
             self.logger.error(f"Wake word detection setup failed: {e}")
             
@@ -236,6 +503,57 @@ class SmartHomeVoiceAssistant:
             }
         }
         
+        # Hyperscan finds every matching pattern in one SIMD scan; re then only extracts groups
+        self.intent_patterns = [
+            (category, re.compile(pattern, re.IGNORECASE))
+            for category, config in self.command_mappings.items()
+            for pattern in config['patterns']
+        ]
+        self.intent_database = None
+        if HYPERSCAN_AVAILABLE:
+            try:
+                expressions = [pattern.pattern.encode() for _, pattern in self.intent_patterns]
+                self.intent_database = hyperscan.Database()
+                self.intent_database.compile(
+                    expressions=expressions,
+                    ids=list(range(len(expressions))),
+                    elements=len(expressions),
+                    flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(expressions)
+                )
+            except Exception as e:
+                self.logger.error(f"Hyperscan compile failed, using re: {e}")
+                self.intent_database = None
+                
+        # Room keyword -> device name, matched against a command target in one regex scan
+        self.device_mappings = {
+            'lights': {
+                'hall': 'hall_light',
+                'kitchen': 'kitchen_light',
+                'living': 'living_room_light',
+                'bedroom': 'bedroom_light',
+                'bathroom': 'bathroom_light',
+                'all': 'all_lights'
+            },
+            'fans': {
+                'hall': 'hall_fan',
+                'kitchen': 'kitchen_fan',
+                'living': 'living_room_fan',
+                'bedroom': 'bedroom_fan',
+                'all': 'all_fans'
+            },
+            'doors': {
+                'hall': 'hall_door',
+                'kitchen': 'kitchen_door',
+                'living': 'living_room_door',
+                'main': 'main_door',
+                'front': 'main_door'
+            }
+        }
+        self.device_patterns = {
+            kind: re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in mapping) + r')\b')
+            for kind, mapping in self.device_mappings.items()
+        }
+        
     def on_mqtt_connect(self, client, userdata, flags, rc):
         if rc == 0:
             self.logger.info("Connected to MQTT broker")
@@ -245,7 +563,7 @@ class SmartHomeVoiceAssistant:
             
     def on_mqtt_message(self, client, userdata, msg):
         try:
-            message = json.loads(msg.payload.decode())
+            message = json_loads(msg.payload)
             self.device_states = message
         except Exception as e:
             self.logger.error(f"Error processing MQTT message: {e}")
@@ -254,52 +572,139 @@ class SmartHomeVoiceAssistant:
         """Continuously listen for wake words"""
         self.logger.info("Listening for wake words...")
         
+        if self.wake_word_model is not None:
+            self.listen_for_wake_word_on_device()
+            return
+            
+        # Each handler does one step and returns the next state
+        handlers = {
+            WakeWordState.LISTENING: self.wake_word_listening,
+            WakeWordState.MATCHED: self.wake_word_matched,
+            WakeWordState.BACKOFF: self.wake_word_backoff
+        }
+        self.wake_word_failures = 0
+        state = WakeWordState.LISTENING
         while True:
-            try:
-                with self.microphone as source:
+            state = handlers[state]()
+            
+    def wake_word_listening(self):
+        """Capture one phrase and check it for a wake word"""
+        try:
+            with self.microphone as source:
+                # Recognize while the phrase is still being spoken, stopping at the wake word
+                if self.vosk_model is not None:
+                    text = self.stream_recognize(source, 1, 3, self.config.WAKE_WORDS)
+                else:
                     # Listen for wake word with shorter timeout
                     audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=3)
                     
+            if self.vosk_model is None:
+                # Noise that tripped the energy threshold is not worth a network request
+                if not self.contains_speech(audio):
+                    return WakeWordState.LISTENING
+                text = self.recognizer.recognize_google(audio).lower()
+                
+            self.wake_word_failures = 0
+            if text and any(wake_word in text for wake_word in self.config.WAKE_WORDS):
+                return WakeWordState.MATCHED
+            return WakeWordState.LISTENING
+            
+        except (sr.WaitTimeoutError, sr.UnknownValueError):
+            # Silence or unintelligible audio is expected, keep listening
+            return WakeWordState.LISTENING
+        except sr.RequestError as e:
+            self.logger.error(f"Could not request results: {e}")
+        except Exception as e:
+            self.logger.error(f"Error in wake word detection: {e}")
+            
+        self.wake_word_failures += 1
+        return WakeWordState.BACKOFF
+        
+    def wake_word_matched(self):
+        """Acknowledge the wake word and handle the command that follows"""
+        self.wake_word_detected = True
+        self.speak("Yes, I'm listening!", wait=True)
+        self.process_voice_command()
+        
+        # Keep the microphone from hearing the reply as the next wake word
+        self.wait_until_spoken()
+        return WakeWordState.LISTENING
+        
+    def wake_word_backoff(self):
+        """Wait before listening again, doubling the delay with each consecutive failure"""
+        delay = min(
+            self.config.WAKE_WORD_BACKOFF_MAX,
+            self.config.WAKE_WORD_BACKOFF_BASE * 2 ** (self.wake_word_failures - 1)
+        )
+        time.sleep(delay)
+        return WakeWordState.LISTENING
+        
+    def contains_speech(self, audio):
+        """Check a recorded phrase for voiced frames; always true without webrtcvad"""
+        if self.vad is None:
+            return True
+            
+        pcm = audio.get_raw_data(convert_rate=self.config.SAMPLE_RATE, convert_width=2)
+        frame_bytes = self.config.SAMPLE_RATE * self.config.VAD_FRAME_MS // 1000 * 2
+        voiced = 0
+        for start in range(0, len(pcm) - frame_bytes + 1, frame_bytes):
+            if self.vad.is_speech(pcm[start:start + frame_bytes], self.config.SAMPLE_RATE):
+                voiced += 1
+                if voiced >= self.config.VAD_MIN_SPEECH_FRAMES:
+                    return True
+        return False
+        
+    def listen_for_wake_word_on_device(self):
+        """Run Porcupine over raw microphone frames; no audio leaves the device until it fires"""
+        porcupine = self.wake_word_model
+        input_class = RingBufferInput if SOUNDDEVICE_AVAILABLE else PyAudioInput
+        microphone = input_class(porcupine.sample_rate, porcupine.frame_length)
+        
+        try:
+            while True:
                 try:
-                    text = self.recognizer.recognize_google(audio).lower()
-                    
-                    # Check for wake words
-                    for wake_word in self.config.WAKE_WORDS:
-                        if wake_word in text:
-                            self.wake_word_detected = True
-                            self.speak("Yes, I'm listening!")
-                            self.process_voice_command()
-                            break
-                            
-                except sr.UnknownValueError:
-                    # No speech detected, continue listening
-                    pass
-                except sr.RequestError as e:
-                    self.logger.error(f"Could not request results: {e}")
+                    if porcupine.process(microphone.read()) < 0:
+                        continue
+                        
+                    # Release the input while the command is captured through the microphone
+                    microphone.stop()
+                    self.wake_word_detected = True
+                    self.speak("Yes, I'm listening!", wait=True)
+                    self.process_voice_command()
+                    self.wait_until_spoken()
+                    microphone.start()
                     
-            except sr.WaitTimeoutError:
-                # Timeout is expected, continue listening
-                pass
-            except Exception as e:
-                self.logger.error(f"Error in wake word detection: {e}")
-                time.sleep(1)
-                
+                except Exception as e:
+                    self.logger.error(f"Error in wake word detection: {e}")
+                    self.wait_until_spoken()
+                    microphone.start()
+        finally:
+            microphone.close()
+            porcupine.delete()
+            
     def process_voice_command(self):
         """Process voice command after wake word detection"""
         try:
-            self.speak("What can I help you with?")
+            # Finish the prompt before listening so the microphone does not pick it up
+            self.speak("What can I help you with?", wait=True)
             
-            with self.microphone as source:
-                # Listen for command with longer timeout
-                audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=10)
-                
-            # Try multiple recognition services
-            command_text = self.recognize_speech(audio)
+            if self.vosk_model is not None:
+                # Decode on-device as the command is spoken
+                with self.microphone as source:
+                    command_text = self.stream_recognize(source, 5, 10)
+            else:
+                with self.microphone as source:
+                    # Listen for command with longer timeout
+                    audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=10)
+                    
+                # Try multiple recognition services
+                command_text = self.recognize_speech(audio)
             
             if command_text:
                 self.logger.info(f"Recognized command: {command_text}")
                 response = self.process_natural_language_command(command_text)
-                self.speak(response)
+                if response:
+                    self.speak(response)
             else:
                 self.speak("Sorry, I didn't understand that. Please try again.")
                 
@@ -309,24 +714,37 @@ class SmartHomeVoiceAssistant:
             self.logger.error(f"Error processing voice command: {e}")
             self.speak("Sorry, there was an error processing your command.")
             
-    def recognize_speech(self, audio):
-        """Try multiple speech recognition services"""
-        recognition_services = [
-            ('google', lambda: self.recognizer.recognize_google(audio)),
-            ('sphinx', lambda: self.recognizer.recognize_sphinx(audio)),
-            ('wit', lambda: self.recognizer.recognize_wit(audio, key="YOUR_WIT_AI_KEY") if hasattr(self.recognizer, 'recognize_wit') else None)
-        ]
+    def stream_recognize(self, source, timeout, phrase_time_limit, stop_phrases=()):
+        """Feed microphone chunks to Vosk as they arrive and return the recognized text"""
+        recognizer = vosk.KaldiRecognizer(self.vosk_model, self.config.SAMPLE_RATE)
+        segments = []
         
-        for service_name, recognize_func in recognition_services:
-            try:
-                result = recognize_func()
-                if result:
-                    self.logger.info(f"Recognized using {service_name}: {result}")
-                    return result.lower()
-            except Exception as e:
-                self.logger.debug(f"{service_name} recognition failed: {e}")
-                continue
+        for chunk in self.recognizer.listen(source, timeout=timeout,
+                                            phrase_time_limit=phrase_time_limit, stream=True):
+            pcm = chunk.get_raw_data(convert_rate=self.config.SAMPLE_RATE, convert_width=2)
+            if recognizer.AcceptWaveform(pcm):
+                segments.append(json.loads(recognizer.Result()).get('text', ''))
+                hypothesis = ' '.join(segments)
+            else:
+                hypothesis = ' '.join(segments + [json.loads(recognizer.PartialResult()).get('partial', '')])
                 
+            # Stop listening as soon as the hypothesis contains a stop phrase
+            if any(phrase in hypothesis for phrase in stop_phrases):
+                return hypothesis.strip()
+                
+        segments.append(json.loads(recognizer.FinalResult()).get('text', ''))
+        return ' '.join(segments).strip().lower() or None
+        
+    def recognize_speech(self, audio):
+        """Recognize a recorded phrase with Google; Vosk commands are decoded by stream_recognize"""
+        try:
+            result = self.recognizer.recognize_google(audio)
+            if result:
+                self.logger.info(f"Recognized using google: {result}")
+                return result.lower()
+        except Exception as e:
+            self.logger.debug(f"google recognition failed: {e}")
+            
         return None
         
     def process_natural_language_command(self, text):
@@ -339,11 +757,8 @@ class SmartHomeVoiceAssistant:
                 'type': 'command'
             })
             
-            # Clean and tokenize text
-            cleaned_text = self.clean_text(text)
-            
-            # Extract intent and entities
-            intent, entities = self.extract_intent_and_entities(cleaned_text)
+            # Match the raw text: patterns rely on words like "the" and "to"
+            intent, entities = self.extract_intent_and_entities(text.lower())
             
             if intent:
                 # Execute command based on intent
@@ -356,37 +771,37 @@ class SmartHomeVoiceAssistant:
             self.logger.error(f"Error in NLP processing: {e}")
             return "Sorry, I had trouble understanding your request."
             
-    def clean_text(self, text):
-        """Clean and normalize text"""
-        # Remove punctuation and convert to lowercase
-        text = re.sub(r'[^\w\s]', '', text.lower())
-        
-        # Tokenize and remove stop words
-        tokens = word_tokenize(text)
-        stop_words = set(stopwords.words('english'))
-        filtered_tokens = [word for word in tokens if word not in stop_words]
-        
-        return ' '.join(filtered_tokens)
-        
     def extract_intent_and_entities(self, text):
         """Extract intent and entities from text"""
         intent = None
         entities = {}
         
-        # Check each command category
-        for category, config in self.command_mappings.items():
-            for pattern in config['patterns']:
-                match = re.search(pattern, text, re.IGNORECASE)
+        groups = None
+        if self.intent_database is not None:
+            # Collect the ids of all matching patterns; the lowest id has priority
+            matched_ids = set()
+            self.intent_database.scan(
+                text.encode(),
+                match_event_handler=lambda pattern_id, start, end, flags, context: matched_ids.add(pattern_id)
+            )
+            if matched_ids:
+                intent, pattern = self.intent_patterns[min(matched_ids)]
+                groups = pattern.search(text).groups()
+        else:
+            # Patterns are tried in order; the first one found anywhere in the text wins
+            for category, pattern in self.intent_patterns:
+                match = pattern.search(text)
                 if match:
-                    intent = category
-                    entities['action'] = match.group(1) if match.lastindex >= 1 else None
-                    entities['target'] = match.group(2) if match.lastindex >= 2 else None
-                    entities['value'] = match.group(3) if match.lastindex >= 3 else None
-                    entities['full_match'] = match.groups()
+                    intent, groups = category, match.groups()
                     break
-            if intent:
-                break
                 
+        if groups is not None:
+            group_count = len(groups)
+            entities['action'] = groups[0] if group_count >= 1 else None
+            entities['target'] = groups[1] if group_count >= 2 else None
+            entities['value'] = groups[2] if group_count >= 3 else None
+            entities['full_match'] = groups
+            
         return intent, entities
         
     def execute_intent(self, intent, entities, original_text):
@@ -413,6 +828,11 @@ class SmartHomeVoiceAssistant:
             self.logger.error(f"Error executing intent {intent}: {e}")
             return "Sorry, there was an error executing that command."
             
+    def find_device(self, kind, target):
+        """Device name for the first room keyword in target, or None"""
+        match = self.device_patterns[kind].search(target)
+        return self.device_mappings[kind][match.group(0)] if match else None
+        
     def control_lights(self, entities):
         """Control lighting systems"""
         action = entities.get('action', '').lower()
@@ -422,21 +842,8 @@ class SmartHomeVoiceAssistant:
         state = 'on' if action in ['on', 'brighten', 'switch', 'turn'] else 'off'
         
         # Determine room
-        room_mapping = {
-            'hall': 'hall_light',
-            'kitchen': 'kitchen_light',
-            'living': 'living_room_light',
-            'bedroom': 'bedroom_light',
-            'bathroom': 'bathroom_light',
-            'all': 'all_lights'
-        }
+        room = self.find_device('lights', target)
         
-        room = None
-        for key, value in room_mapping.items():
-            if key in target or key in entities.get('target', ''):
-                room = value
-                break
-                
         if room:
             command = f"{room}_{state}"
             self.send_command(command)
@@ -451,20 +858,8 @@ class SmartHomeVoiceAssistant:
         
         state = 'on' if action in ['on', 'start', 'turn'] else 'off'
         
-        room_mapping = {
-            'hall': 'hall_fan',
-            'kitchen': 'kitchen_fan',
-            'living': 'living_room_fan',
-            'bedroom': 'bedroom_fan',
-            'all': 'all_fans'
-        }
+        room = self.find_device('fans', target)
         
-        room = None
-        for key, value in room_mapping.items():
-            if key in target:
-                room = value
-                break
-                
         if room:
             command = f"{room}_{state}"
             self.send_command(command)
@@ -479,20 +874,8 @@ class SmartHomeVoiceAssistant:
         
         state = 'open' if action in ['open', 'unlock'] else 'close'
         
-        door_mapping = {
-            'hall': 'hall_door',
-            'kitchen': 'kitchen_door',
-            'living': 'living_room_door',
-            'main': 'main_door',
-            'front': 'main_door'
-        }
+        door = self.find_device('doors', target)
         
-        door = None
-        for key, value in door_mapping.items():
-            if key in target:
-                door = value
-                break
-                
         if door:
             command = f"{door}_{state}"
             self.send_command(command)
@@ -551,19 +934,34 @@ class SmartHomeVoiceAssistant:
             return "I'm not sure what information you're looking for."
             
     def handle_with_ai(self, text):
-        """Handle complex queries using AI"""
+        """Handle complex queries using AI, speaking the reply sentence by sentence as it streams"""
         try:
             # Use OpenAI GPT for complex queries
-            if hasattr(openai, 'api_key') and openai.api_key:
-                response = openai.ChatCompletion.create(
+            self.load_ai_clients()
+            if self.openai is not None:
+                stream = self.openai.ChatCompletion.create(
                     model="gpt-3.5-turbo",
                     messages=[
                         {"role": "system", "content": "You are a smart home assistant. Respond helpfully and concisely."},
                         {"role": "user", "content": text}
                     ],
-                    max_tokens=150
+                    max_tokens=150,
+                    stream=True
                 )
-                return response.choices[0].message.content
+                
+                # Queue each finished sentence while the rest is still being generated
+                pending = ""
+                for chunk in stream:
+                    pending += chunk.choices[0].delta.get('content', '')
+                    *sentences, pending = SENTENCE_END_RE.split(pending)
+                    for sentence in sentences:
+                        self.speak(sentence)
+                        
+                if pending.strip():
+                    self.speak(pending.strip())
+                    
+                # Already spoken
+                return None
             else:
                 return "I don't have enough information to answer that question."
                 
@@ -574,32 +972,70 @@ class SmartHomeVoiceAssistant:
     def send_command(self, command):
         """Send command to smart home system"""
         try:
-            # Send via MQTT
+            # Send via MQTT; the topic already identifies the source, and epoch ms is shorter than ISO
             command_data = {
                 'command': command,
-                'timestamp': datetime.now().isoformat(),
-                'source': 'voice_control'
+                'timestamp': int(time.time() * 1000)
             }
             
-            self.mqtt_client.publish(
-                self.config.MQTT_TOPIC_COMMAND,
-                json.dumps(command_data)
-            )
+            self.publish_queue.put(command_data)
             
             # Also send via HTTP to ESP32
-            url = f"http://{self.config.ESP32_IP}/api/control"
-            data = {'command': command, 'value': '1'}
-            requests.post(url, data=data, timeout=5)
+            self.http_pool.submit(self.post_command, command)
             
             self.logger.info(f"Sent command: {command}")
             
         except Exception as e:
             self.logger.error(f"Error sending command: {e}")
             
-    def speak(self, text):
+    def post_command(self, command):
+        """POST a command to the ESP32 control API"""
+        try:
+            url = f"http://{self.config.ESP32_IP}/api/control"
+            data = {'command': command, 'value': '1'}
+            self.http_session.post(url, data=data, timeout=self.config.ESP32_HTTP_TIMEOUT)
+        except Exception as e:
+            self.logger.error(f"Error posting command to ESP32: {e}")
+            
+    def speak(self, text, wait=False):
+        """Queue text for speech; wait blocks until it has been spoken"""
+        self.logger.info(f"Speaking: {text}")
+        done = threading.Event() if wait else None
+        self.tts_queue.put((text, done))
+        if done is not None:
+            done.wait()
+            
+    def wait_until_spoken(self):
+        """Block until every queued text has been spoken"""
+        self.tts_queue.join()
+        
+    def tts_worker(self):
+        """Speak queued texts in order"""
+        while True:
+            item = self.tts_queue.get()
+            if item is None:
+                self.tts_queue.task_done()
+                break
+                
+            text, done = item
+            try:
+                self.synthesize(text)
+            finally:
+                if done is not None:
+                    done.set()
+                self.tts_queue.task_done()
+                
+    def synthesize(self, text):
         """Convert text to speech"""
         try:
-            self.logger.info(f"Speaking: {text}")
+            # Replay canned responses; dynamic text would only fill the cache directory
+            if self.tts_cache_enabled and text in self.tts_cache:
+                try:
+                    self.tts_cache[text].play().wait_done()
+                    return
+                except Exception as e:
+                    self.logger.error(f"Cached TTS playback failed: {e}")
+                    
             self.tts_engine.say(text)
             self.tts_engine.runAndWait()
         except Exception as e:
@@ -646,6 +1082,11 @@ class SmartHomeVoiceAssistant:
                 time.sleep(1)
         except KeyboardInterrupt:
             print("\nShutting down Voice Control System...")
+            self.tts_queue.put(None)
+            self.publish_queue.put(None)
+            self.publish_thread.join(timeout=1)
+            self.http_pool.shutdown(wait=False)
+            self.http_session.close()
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
 